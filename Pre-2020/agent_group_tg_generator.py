@@ -6,150 +6,46 @@
 # or remote scanning purposes with Nessus.
 #
 # Author: ThisTooShallXSS (https://github.com/thistooshallxss)
-# Requirements: Python 2.7+
+# Requirements: Python 3.7+, requests, aiohttp
 #
 # Usage: 
 # - python agent_group_tg_generator.py
 
-import json, requests
+import itertools
+import os
 import sys
-import pickle
 
-requests.packages.urllib3.disable_warnings()
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from tio_client import PAGE_SIZE, get_data, iter_items, page_url
+from tio_async import get_all_data
+from tio_cache import cached_get_data
+from tio_target_groups import build_members, get_registry
+from tio_ipmatch import is_internal
 
 class agent_group(object): # Object for temp storing new AWS creds.
     def __init__(self, group_id, name):
         self.group_id = group_id
         self.name = name
 
-def save_keys():
-    #assumption is that the user keys didn't work or don't exsist
-    print("Please provide your Tenable.io User API keys.")
-    access_key = input("Please provide your Access Key (use quotes): ")
-    secret_key = input("Please provide your Secret Key (use quotes): ")
-
-    dicts = {"Access Key": access_key, "Secret Key": secret_key}
-
-    pickle_out = open("keys.pickle", "wb")
-    pickle.dump(dicts, pickle_out)
-    pickle_out.close()
-
-    print("Now you have keys, re-run your command")
-    sys.exit()
-
-def grab_headers():
-    import os
-
-    access_key = ''
-    secret_key = ''
-
-    #check for API keys; if none, get them from the user by calling save_keys()
-    if os.path.isfile('./keys.pickle') is False:
-        save_keys()
-    else:
-        pickle_in = open("keys.pickle", "rb")
-        keys = pickle.load(pickle_in)
-        access_key = keys["Access Key"]
-        secret_key = keys["Secret Key"]
-
-    #set the header
-    headers = {'Content-type':'application/json',
-               'X-ApiKeys':'accessKey='+access_key+';secretKey='+secret_key}
-    return headers
-
-def get_data(url_mod):
-    url = "https://cloud.tenable.com"
-    headers = grab_headers()
-    r = requests.request('GET', url + url_mod, headers=headers, verify=False)
-
-    if r.status_code != 200:
-        print('Status:', r.status_code, 'Problem with the initial GET assets request. Exiting.')
-        sys.exit()
-
-    data = r.json()
-    return data
-
-def tg_name_exists(tg_name):
-    target_groups = get_data('/target-groups')["target_groups"]
-
-    for x in range(len(target_groups)):
-        if tg_name == target_groups[x]["name"]:
-            return target_groups[x]["id"]
-
-    return 0
-
 def create_comma_sep_list(ip_list):
-    ips = ''
-    for x in range(len(ip_list)):
-        if is_internal(ip_list[x]): # Makes sure we're only adding RFC-1918 internal IPs.
-            if len(ips) < 1:
-                ips = ip_list[x]
-            else:
-                ips = ips + ',' + ip_list[x]
-
-    return ips
-
-def update_existing_tg(tg_id, ip_list, tg_name):
-    tgt_group_id = create_target_group('PUT', ip_list, tg_name, tg_id)
-
-    return tgt_group_id
-
-def create_target_group(req_type, ip_addrs, name, tg_id):
-    # This makes the POST request to build the target group on Tenable.io
-    json_payload = '{{"name":"{}","members":"{}","type":"system","acls":[{{"permissions":64,"type":"default"}}]}}'.format(name, ip_addrs)
-    url = "https://cloud.tenable.com/target-groups"
-
-    if tg_id > 0:
-        url = url + '/{}'.format(tg_id)
-
-    headers = grab_headers()
-    r = requests.request(req_type, url, headers=headers, data=json_payload, verify=False)
-    
-    if r.status_code != 200:
-        print('Status:', r.status_code, 'Problem with the POST request to create target group. Exiting.')
-        sys.exit()
-
-    tgt_group_id = r.json()["id"]
-
-    return tgt_group_id
+    # Deduped, sorted, contiguous IPs collapsed to CIDR blocks, built in one pass.
+    # Only RFC-1918 internal IPs are kept.
+    return build_members(ip_list, keep=is_internal)
 
 def create_tg(name, ip_list):
     # Ensure that there is at least one IP returned in the query.
     target_group_name = 'Agent Group - {}'.format(name)
-    target_group_id = tg_name_exists(target_group_name)
+    result = get_registry().sync(target_group_name, ip_list) # Only POSTs/PUTs if the members changed.
 
-    if target_group_id > 0:
-        target_group_id = update_existing_tg(target_group_id, ip_list, target_group_name)
-    else:
-        target_group_id = create_target_group('POST', ip_list, target_group_name, 0)
-
-    # Now that we have a list of the IPs only seen by the tag, we can create the target group.
-    if target_group_id > 0:
-        print('Target group created! (Name: {})'.format(target_group_name))
-        print('Devices Included: {}').format(len(ip_list.split(',')))
+    if not result.changed:
+        print('Target group unchanged. Name: {} - (IPs: {})'.format(target_group_name, result.addresses))
+    elif result.id > 0:
+        print('Target group {}. Name: {} - (IPs: {}, added: {}, removed: {})'.format(
+            'created' if result.created else 'updated', target_group_name, result.addresses, result.added, result.removed))
         print("{}\n".format(ip_list))
 
-def is_internal(ip):
-
-    from struct import unpack
-    from socket import AF_INET, inet_pton
-
-    # First we make sure that it's a private/internal IP address.
-    f = unpack('!I',inet_pton(AF_INET,ip))[0]
-    private = (
-        [ 2130706432, 4278190080 ], # 127.0.0.0,   255.0.0.0
-        [ 3232235520, 4294901760 ], # 192.168.0.0, 255.255.0.0
-        [ 2886729728, 4293918720 ], # 172.16.0.0,  255.240.0.0
-        [ 167772160,  4278190080 ], # 10.0.0.0,    255.0.0.0
-    )
-    for net in private: # If this IP address is an internal IP, proceed.
-        if (f & net[1]) == net[0]:
-            return True
-
-    return False
-
 def get_agent_scanner_id(manager_name):
-    scanners = get_data('/scanners')["scanners"]
+    scanners = cached_get_data('/scanners')["scanners"]
 
     for x in range(len(scanners)):
         if manager_name in scanners[x]["name"]:
@@ -169,25 +65,35 @@ def get_agent_groups(scanner_id):
 
     return agent_groups
 
-def get_agent_ips(scanner_id, group_id):  
+def get_agent_ips(scanner_id, agent_groups):
+    # Returns one list of agent IPs per agent group, fetching every group concurrently.
+    uris = []
+    filter_options = '?sort=name:asc'
+
+    for x in range(len(agent_groups)):
+        group_option = '&f=groups:eq:{}&ft=and'.format(agent_groups[x].group_id)
+        uris.append('/scanners/{}/agents{}{}'.format(scanner_id, filter_options, group_option))
+
     agent_ips = []
-    filter_options = '?offset=0&limit=5000&sort=name:asc'
-    group_option = '&f=groups:eq:{}&ft=and'.format(group_id)
-    uri = '/scanners/{}/agents{}{}'.format(scanner_id, filter_options, group_option)
+    first_pages = get_all_data([page_url(uri, 0, PAGE_SIZE) for uri in uris])
+
+    for x in range(len(uris)):
+        agents = first_pages[x]["agents"]
 
-    agents = get_data(uri)["agents"]
+        if first_pages[x]["pagination"]["total"] > len(agents): # Page through groups larger than PAGE_SIZE.
+            agents = itertools.chain(agents, iter_items(uris[x], 'agents', offset=len(agents)))
 
-    for x in range(len(agents)):
-        agent_ips.append(agents[x]['ip'])
+        agent_ips.append([agent['ip'] for agent in agents])
 
     return agent_ips
 
 def main():
     scanner_id = get_agent_scanner_id('US Cloud Scanner')
     agent_groups = get_agent_groups(scanner_id)
+    all_agent_ips = get_agent_ips(scanner_id, agent_groups)
 
     for x in range(len(agent_groups)):
-        agent_ip_list = get_agent_ips(scanner_id, agent_groups[x].group_id)
+        agent_ip_list = all_agent_ips[x]
 
         if len(agent_ip_list) > 0:
             tg_ip_list = create_comma_sep_list(agent_ip_list)
@@ -1,9 +1,10 @@
 #!/usr/bin/env python
 #
 # Summary:
-# Given a CIDR address, this script will create a target group called
-# "To Be Deleted - 10.85.0.0/16" for example, and then use that to
-# filter assets belonging to that network, so they can then be deleted.
+# Given a CIDR address, this script will stream every asset seen in the
+# last DATE_RANGE_TO_DELETE days from a v3 asset export, and match each
+# one's IPs against the network as the records arrive (no temporary
+# target group, no capped workbench response held in memory).
 # The script will automatically delete any matching assets. Deletion
 # may take up to a minute to be reflected in Tenable.io
 #
@@ -11,185 +12,116 @@
 #       unaffected by assets deleted through the UI or this script.
 #
 # Author: ThisTooShallXSS (https://github.com/thistooshallxss)
-# Requirements: Python 2.7, requests
+# Requirements: Python 3.7+, requests, aiohttp, numpy (optional, faster matching)
 #
 # Usage: 
 # - python delete_assets_large.py '10.18.0.0/16'    # Class-B (65k IPs)
 # - python delete_assets_large.py '192.168.1.0/24'  # Class-C (254 IPs)
 # - python delete_assets_large.py '192.168.1.13/32' # Single-IP deletion
 
-import json, requests
+import datetime
+import os
+import shutil
 import sys
-import pickle
+import tempfile
 
-requests.packages.urllib3.disable_warnings()
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from tio_client import bulk_delete_assets
+from tio_exports import create_export, download_export, iter_file_records, wait_for_export
+from tio_async import delete_all_assets
+from tio_ipmatch import cidr_matcher, ip_in_networks
+from tio_purge import journal_path, purge_journal, rate_meter
 
 DATE_RANGE_TO_DELETE = 30
+BULK_DELETE = True # False sends one DELETE per asset instead of server-side bulk jobs.
+PURGE_CONCURRENCY = 50 # DELETEs in flight at once when BULK_DELETE is False.
+MATCH_BATCH = 100000 # Asset IPs matched against the CIDR per batch.
 
-def save_keys():
-    #assumption is that the user keys didn't work or don't exsist
-    print("Please provide your Tenable.io User API keys.")
-    access_key = input("Please provide your Access Key (use quotes): ")
-    secret_key = input("Please provide your Secret Key (use quotes): ")
+def purge_assets(assets, journal=None):
+    # Every deleted UUID is appended to the journal (if given) as soon as it's
+    # gone, so an interrupted purge can pick up where it left off.
+    meter = rate_meter(len(assets))
 
-    dicts = {"Access Key": access_key, "Secret Key": secret_key}
+    def deleted(uuids):
+        if journal:
+            journal.record(uuids)
+        meter.add(1 if isinstance(uuids, str) else len(uuids))
 
-    pickle_out = open("keys.pickle", "wb")
-    pickle.dump(dicts, pickle_out)
-    pickle_out.close()
+    if BULK_DELETE:
+        # A handful of server-side bulk delete requests, instead of one DELETE per asset.
+        # Only batches Tenable.io matched in full are journaled as deleted.
+        count, unconfirmed = bulk_delete_assets(assets, on_batch=deleted)
+        meter.finish()
+        print("Bulk delete accepted for {} of {} assets.".format(count, len(assets)))
 
-    print("Now you have keys, re-run your command")
-    sys.exit()
+        if len(unconfirmed) > 0:
+            print("Could not confirm the deletion of {} assets.".format(len(unconfirmed)))
 
-def grab_headers():
-    import os
+        return len(unconfirmed) == 0
 
-    access_key = ''
-    secret_key = ''
+    # Issue the DELETEs concurrently on a bounded pool instead of waiting on each one in turn.
+    failed = delete_all_assets(assets, concurrency=PURGE_CONCURRENCY, on_deleted=deleted)
+    meter.finish()
 
-    #check for API keys; if none, get them from the user by calling save_keys()
-    if os.path.isfile('./keys.pickle') is False:
-        save_keys()
-    else:
-        pickle_in = open("keys.pickle", "rb")
-        keys = pickle.load(pickle_in)
-        access_key = keys["Access Key"]
-        secret_key = keys["Secret Key"]
-
-    #set the header
-    headers = {'Content-type':'application/json',
-               'X-ApiKeys':'accessKey='+access_key+';secretKey='+secret_key}
-    return headers
-
-def get_data(url_mod):
-    url = "https://cloud.tenable.com"
-    headers = grab_headers()
-    r = requests.request('GET', url + url_mod, headers=headers, verify=False)
-    
-    if r.status_code != 200:
-        print('Status:', r.status_code, 'Problem with the initial GET assets request. Quitting...')
-        sys.exit()
-
-    data = r.json()
-    return data
-
-def delete_asset(uuid):
-    url = "https://cloud.tenable.com"
-    url_mod = "/workbenches/assets/{}".format(uuid)
-    headers = grab_headers()
-
-    r = requests.request('DELETE', url + url_mod, headers=headers, verify=False)
-    
-    if r.status_code != 202:
-        print('Status:', r.status_code, 'Problem with the DELETE asset request. Exiting.')
-        sys.exit()    
-
-    return
-
-def tg_name_exists(tg_name):
-    target_groups = get_data('/target-groups')["target_groups"]
-
-    for x in range(len(target_groups)):
-        if tg_name == target_groups[x]["name"]:
-            return target_groups[x]["id"]
-
-    return 0
-
-def update_existing_tg(tg_id, ip_list, tg_name):
-    tgt_group_id = create_target_group('PUT', ip_list, tg_name, tg_id)
-
-    return tgt_group_id
-
-def create_target_group(req_type, ip_addrs, name, tg_id):
-    # This makes the POST request to build the target group on Tenable.io
-    json_payload = '{{"name":"{}","members":"{}","type":"system","acls":[{{"permissions":64,"type":"default"}}]}}'.format(name, ip_addrs)
-    url = "https://cloud.tenable.com/target-groups"
-
-    if tg_id > 0:
-        url = url + '/{}'.format(tg_id)
-
-    headers = grab_headers()
-    r = requests.request(req_type, url, headers=headers, data=json_payload, verify=False)
-    
-    if r.status_code != 200:
-        print('Status:', r.status_code, 'Problem with the POST request to create target group. Exiting.')
-        sys.exit()
-
-    tgt_group_id = r.json()["id"]
-
-    return tgt_group_id
-
-def create_tg(name, ip_list):
-    # Ensure that there is at least one IP returned in the query.
-    target_group_name = name
-    target_group_id = tg_name_exists(target_group_name)
-
-    if target_group_id > 0:
-        target_group_id = update_existing_tg(target_group_id, ip_list, target_group_name)
-    else:
-        target_group_id = create_target_group('POST', ip_list, target_group_name, 0)
-
-    # Now that we have a list of the IPs only seen by the tag, we can create the target group.
-    if target_group_id > 0:
-        print('Target group updated. Name: {}'.format(target_group_name))
-        print("Members: {}\n".format(ip_list))
-
-    return target_group_id
-
-def purge_assets(assets):
-    for x in range(len(assets)):
-        try:
-            delete_asset(assets[x])
-        except:
-            print("Could not delete asset uuid: {}").format(assets[x])
+    for x in range(len(failed)):
+        print("Could not delete asset uuid: {}".format(failed[x]))
 
-    return True
+    return len(failed) == 0
 
 def addressInNetwork(ip, net):
-    import socket,struct
+    # The network is parsed once and cached, instead of on every call.
+    return ip_in_networks(ip, net)
 
-    ipaddr = int(''.join([ '%02x' % int(x) for x in ip.split('.') ]), 16)
-    netstr, bits = net.split('/')
-    netaddr = int(''.join([ '%02x' % int(x) for x in netstr.split('.') ]), 16)
-    mask = (0xffffffff << (32 - int(bits))) & 0xffffffff
-
-    return (ipaddr & mask) == (netaddr & mask)
+def _match_batch(matcher, asset_ips, owners, matching_uuids, seen):
+    for x in matcher.select(asset_ips):
+        if owners[x] not in seen: # An asset with several matching IPs is only deleted once.
+            seen.add(owners[x])
+            matching_uuids.append(owners[x])
 
 def find_matching_hosts(cidr_str):
+    # Only the fields we need, for assets seen within the date range.
+    cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=DATE_RANGE_TO_DELETE)
+    payload = {
+        "name": "delete_assets_large - {}".format(cidr_str),
+        "source": "assets",
+        "format": "json",
+        "definition": {
+            "fields": ["id", "ipv4_addresses", "last_observed"],
+            "filter": {"and": [{"property": "last_observed", "operator": "gte", "value": cutoff.strftime('%Y-%m-%dT%H:%M:%S.000Z')}]}
+        },
+        "expiration": 2
+    }
+
+    matcher = cidr_matcher(cidr_str)
+    matching_uuids = []
+    seen = set()
+    asset_ips = []
+    owners = []
 
-    # Create target group with cidr_str
-    tg_name = "To Be Deleted - {}".format(cidr_str)
-    tg_id = create_tg(tg_name, cidr_str)
-
-    if tg_id == 0:
-        print("Target group could not be created for {}").format(cidr_str)
-        sys.exit()
-
-    tg_filtered_url = '/workbenches/assets?date_range={}&'\
-                      'filter.0.quality=eq&filter.0.filter=target_group&'\
-                      'filter.0.value={}&filter.search_type=and'.format(DATE_RANGE_TO_DELETE, tg_id)
-
-    all_assets = get_data(tg_filtered_url)["assets"]
-
-    if len(all_assets) < 1:
-        print("No assets remaining from target group. Quitting...")
-        sys.exit()
+    # The export is downloaded to a temp file first: dropped connections are
+    # resumed, and a download that can't be completed raises instead of
+    # looking like an empty export.
+    job_id = create_export(payload)
+    wait_for_export(job_id)
+    tmp_dir = tempfile.mkdtemp(prefix='delete_assets_large-')
 
-    matching_uuids = []
-    cidr_quickmatch = cidr_str[0:3]
+    try:
+        path = download_export(job_id, os.path.join(tmp_dir, 'assets.json'))
 
-    for x in range(len(all_assets)):
-        ipv4_data = all_assets[x]["ipv4"]
+        # Match IPs a batch at a time as the file is parsed, so memory holds
+        # one batch plus the matches, however many assets the container has.
+        for asset in iter_file_records(path):
+            for ip in asset.get("ipv4_addresses") or []:
+                asset_ips.append(ip)
+                owners.append(asset["id"])
 
-        for y in range(len(ipv4_data)):
-            ip_quickmatch = ipv4_data[y][0:3]
+            if len(asset_ips) >= MATCH_BATCH:
+                _match_batch(matcher, asset_ips, owners, matching_uuids, seen)
+                asset_ips, owners = [], []
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
 
-            # take first 3 chars of asset IP, and ensure it matches first 3 of cidr.
-            if ip_quickmatch == cidr_quickmatch:
-                #print("Matching Asset. IP: {} ").format(ipv4_data[y])
-                # if so, check against addressInNetwork() to see if it's to be added to the list.
-                if addressInNetwork(ipv4_data[y], cidr_str):
-                    matching_uuids.append(all_assets[x]["id"])
+    _match_batch(matcher, asset_ips, owners, matching_uuids, seen)
 
     return matching_uuids
 
@@ -202,17 +134,31 @@ def main():
         print("Please specify the CIDR where assets will be deleted. ex '192.168.2.0/24' (Use Quotes)")
         cidr_arg = input("> ")
 
-    try:
-        to_be_deleted = find_matching_hosts(cidr_arg)
-    except:
-        print("Could not fetch hosts to be deleted.")
+    journal = purge_journal(journal_path(cidr_arg))
+
+    if journal.planned:
+        # An earlier run for this CIDR didn't finish. Resume it instead of re-fetching.
+        to_be_deleted = journal.remaining()
+        print("Resuming purge from {}: {} of {} assets left.".format(journal.path, len(to_be_deleted), len(journal.planned)))
+    else:
+        try:
+            to_be_deleted = find_matching_hosts(cidr_arg)
+        except Exception as e:
+            # Not the same as "nothing matched": don't plan, don't report zero.
+            print("Could not fetch hosts to be deleted: {}".format(e))
+            sys.exit(1)
+        journal.plan(to_be_deleted)
 
     if len(to_be_deleted) > 0:
-        print("Number of systems being deleted: {}").format(len(to_be_deleted))
-        if purge_assets(to_be_deleted):
+        print("Number of systems being deleted: {}".format(len(to_be_deleted)))
+        if purge_assets(to_be_deleted, journal):
             print("Successful deletion.")
+        else:
+            print("Run the same command again to retry the assets that weren't deleted.")
     else:
         print("No assets found matching this CIDR. Quitting...")
 
+    journal.close()
+
 if __name__ == '__main__':
     main()
@@ -10,118 +10,81 @@
 #       unaffected by assets deleted through the UI or this script.
 #
 # Author: ThisTooShallXSS (https://github.com/thistooshallxss)
-# Requirements: Python 2.7, requests
+# Requirements: Python 3.7+, requests, aiohttp, numpy (optional, faster matching)
 #
 # Usage: 
 # - python delete_assets_small.py '10.18.0.0/16'    # Class-B (65k IPs)
 # - python delete_assets_small.py '192.168.1.0/24'  # Class-C (254 IPs)
 # - python delete_assets_small.py '192.168.1.13/32' # Single-IP deletion
 
-import json, requests
+import os
 import sys
-import pickle
 
-requests.packages.urllib3.disable_warnings()
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from tio_client import bulk_delete_assets, get_data
+from tio_async import delete_all_assets
+from tio_ipmatch import cidr_matcher, ip_in_networks
+from tio_purge import journal_path, purge_journal, rate_meter
 
 DATE_RANGE_TO_DELETE = 30
+BULK_DELETE = True # False sends one DELETE per asset instead of server-side bulk jobs.
+PURGE_CONCURRENCY = 50 # DELETEs in flight at once when BULK_DELETE is False.
 
-def save_keys():
-    #assumption is that the user keys didn't work or don't exsist
-    print("Please provide your Tenable.io User API keys.")
-    access_key = input("Please provide your Access Key (use quotes): ")
-    secret_key = input("Please provide your Secret Key (use quotes): ")
+def purge_assets(assets, journal=None):
+    # Every deleted UUID is appended to the journal (if given) as soon as it's
+    # gone, so an interrupted purge can pick up where it left off.
+    meter = rate_meter(len(assets))
 
-    dicts = {"Access Key": access_key, "Secret Key": secret_key}
+    def deleted(uuids):
+        if journal:
+            journal.record(uuids)
+        meter.add(1 if isinstance(uuids, str) else len(uuids))
 
-    pickle_out = open("keys.pickle", "wb")
-    pickle.dump(dicts, pickle_out)
-    pickle_out.close()
+    if BULK_DELETE:
+        # A handful of server-side bulk delete requests, instead of one DELETE per asset.
+        # Only batches Tenable.io matched in full are journaled as deleted.
+        count, unconfirmed = bulk_delete_assets(assets, on_batch=deleted)
+        meter.finish()
+        print("Bulk delete accepted for {} of {} assets.".format(count, len(assets)))
 
-    print("Now you have keys, re-run your command")
-    sys.exit()
+        if len(unconfirmed) > 0:
+            print("Could not confirm the deletion of {} assets.".format(len(unconfirmed)))
 
-def grab_headers():
-    import os
+        return len(unconfirmed) == 0
 
-    access_key = ''
-    secret_key = ''
+    # Issue the DELETEs concurrently on a bounded pool instead of waiting on each one in turn.
+    failed = delete_all_assets(assets, concurrency=PURGE_CONCURRENCY, on_deleted=deleted)
+    meter.finish()
 
-    #check for API keys; if none, get them from the user by calling save_keys()
-    if os.path.isfile('./keys.pickle') is False:
-        save_keys()
-    else:
-        pickle_in = open("keys.pickle", "rb")
-        keys = pickle.load(pickle_in)
-        access_key = keys["Access Key"]
-        secret_key = keys["Secret Key"]
-
-    #set the header
-    headers = {'Content-type':'application/json',
-               'X-ApiKeys':'accessKey='+access_key+';secretKey='+secret_key}
-    return headers
-
-def get_data(url_mod):
-    url = "https://cloud.tenable.com"
-    headers = grab_headers()
-    r = requests.request('GET', url + url_mod, headers=headers, verify=False)
-    
-    if r.status_code != 200:
-        print('Status:', r.status_code, 'Problem with the initial GET assets request. Quitting...')
-        sys.exit()
-
-    data = r.json()
-    return data
-
-def delete_asset(uuid):
-    url = "https://cloud.tenable.com"
-    url_mod = "/workbenches/assets/{}".format(uuid)
-    headers = grab_headers()
-
-    r = requests.request('DELETE', url + url_mod, headers=headers, verify=False)
-    
-    if r.status_code != 202:
-        print('Status:', r.status_code, 'Problem with the DELETE asset request. Quitting...')
-        sys.exit()    
-
-    return
-
-def purge_assets(assets):
-    for x in range(len(assets)):
-        try:
-            delete_asset(assets[x])
-        except:
-            print("Could not delete asset uuid: {}").format(assets[x])
+    for x in range(len(failed)):
+        print("Could not delete asset uuid: {}".format(failed[x]))
 
-    return True
+    return len(failed) == 0
 
 def addressInNetwork(ip, net):
-    import socket,struct
-
-    ipaddr = int(''.join([ '%02x' % int(x) for x in ip.split('.') ]), 16)
-    netstr, bits = net.split('/')
-    netaddr = int(''.join([ '%02x' % int(x) for x in netstr.split('.') ]), 16)
-    mask = (0xffffffff << (32 - int(bits))) & 0xffffffff
-
-    return (ipaddr & mask) == (netaddr & mask)
+    # The network is parsed once and cached, instead of on every call.
+    return ip_in_networks(ip, net)
 
 def find_matching_hosts(cidr_str):
     url = '/workbenches/assets?date_range={}'.format(DATE_RANGE_TO_DELETE)
     all_assets = get_data(url)["assets"]
 
-    matching_uuids = []
-    cidr_quickmatch = cidr_str[0:3]
+    # Flatten every asset's IPs into one list, and match them all in one pass.
+    asset_ips = []
+    owners = []
 
-    for x in range(len(all_assets)):
-        ipv4_data = all_assets[x]["ipv4"]
+    for asset in all_assets:
+        for ip in asset["ipv4"]:
+            asset_ips.append(ip)
+            owners.append(asset["id"])
 
-        for y in range(len(ipv4_data)):
-            ip_quickmatch = ipv4_data[y][0:3]
+    matching_uuids = []
+    seen = set()
 
-            # take first 3 chars of asset IP, and ensure it matches first 3 of cidr.
-            if ip_quickmatch == cidr_quickmatch:
-                # if so, check against addressInNetwork() to see if it's to be added to the list.
-                if addressInNetwork(ipv4_data[y], cidr_str):
-                    matching_uuids.append(all_assets[x]["id"])
+    for x in cidr_matcher(cidr_str).select(asset_ips):
+        if owners[x] not in seen: # An asset with several matching IPs is only deleted once.
+            seen.add(owners[x])
+            matching_uuids.append(owners[x])
 
     return matching_uuids
 
@@ -134,18 +97,30 @@ def main():
         print("Please specify the CIDR where assets will be deleted. ex '192.168.2.0/24' (Use Quotes)")
         cidr_arg = input("> ")
 
-    try:
-        to_be_deleted = find_matching_hosts(cidr_arg)
-    except:
-        print("Could not get hosts to be deleted. Quitting...")
-        sys.exit()
+    journal = purge_journal(journal_path(cidr_arg))
+
+    if journal.planned:
+        # An earlier run for this CIDR didn't finish. Resume it instead of re-fetching.
+        to_be_deleted = journal.remaining()
+        print("Resuming purge from {}: {} of {} assets left.".format(journal.path, len(to_be_deleted), len(journal.planned)))
+    else:
+        try:
+            to_be_deleted = find_matching_hosts(cidr_arg)
+        except:
+            print("Could not get hosts to be deleted. Quitting...")
+            sys.exit()
+        journal.plan(to_be_deleted)
 
     if len(to_be_deleted) > 0:
-        print("Number of systems being deleted: {}").format(len(to_be_deleted))
-        if purge_assets(to_be_deleted):
+        print("Number of systems being deleted: {}".format(len(to_be_deleted)))
+        if purge_assets(to_be_deleted, journal):
             print("Successful deletion.")
+        else:
+            print("Run the same command again to retry the assets that weren't deleted.")
     else:
         print("No assets found matching this CIDR. Quitting...")
 
+    journal.close()
+
 if __name__ == '__main__':
     main()
@@ -22,165 +22,63 @@
 # - python fidelity_agent_targetscan.py (Will find all internal (RFC-1918) IPs without CIDR specified)
 #
 
-import json, requests
+import os
 import sys
-import pickle
 
-requests.packages.urllib3.disable_warnings()
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from tio_client import get_client, get_data, create_target_group
+from tio_cache import cached_get_data
+from tio_target_groups import build_members
+from tio_ipmatch import scan_scope
 
 TIMEFRAME = 90 # Time (in days) that we'll include in the search. 0 for all.
 SCANNER_NAME = 'tnsappliance-123456' # Provide the name of an already linked scanner or group.
 FOLDER_NAME = 'My Scans' # Provide the name of an already created folder.
+DEFAULT_SCAN_RANGE = '10.0.0.0/8,172.16.0.0/12,192.168.0.0/16' # Used when no CIDR is passed in.
 
 class agent_only_assets(object): # Object for temp storing new AWS creds.
     def __init__(self, ipv4, fqdn):
         self.ipv4 = ipv4
         self.fqdn = fqdn
 
-def save_keys():
-    #assumption is that the user keys didn't work or don't exsist
-    print("Please provide your Tenable.io User API keys.")
-    access_key = input("Please provide your Access Key (use quotes): ")
-    secret_key = input("Please provide your Secret Key (use quotes): ")
-
-    dicts = {"Access Key": access_key, "Secret Key": secret_key}
-
-    pickle_out = open("keys.pickle", "wb")
-    pickle.dump(dicts, pickle_out)
-    pickle_out.close()
-
-    print("Now you have keys, re-run your command")
-    sys.exit()
-
-def grab_headers():
-    import os
-
-    access_key = ''
-    secret_key = ''
-
-    #check for API keys; if none, get them from the user by calling save_keys()
-    if os.path.isfile('./keys.pickle') is False:
-        save_keys()
-    else:
-        pickle_in = open("keys.pickle", "rb")
-        keys = pickle.load(pickle_in)
-        access_key = keys["Access Key"]
-        secret_key = keys["Secret Key"]
-
-    #set the header
-    headers = {'Content-type':'application/json',
-               'X-ApiKeys':'accessKey='+access_key+';secretKey='+secret_key}
-    return headers
-
-def get_data(url_mod):
-    url = "https://cloud.tenable.com"
-    headers = grab_headers()
-    r = requests.request('GET', url + url_mod, headers=headers, verify=False)
-
-    if r.status_code != 200:
-        print('Status:', r.status_code, 'Problem with the initial GET assets request. Exiting.')
-        sys.exit()
-
-    data = r.json()
-    return data
-
-def create_target_group(req_type, ip_addrs, name):
-    # This makes the POST request to build the target group on Tenable.io
-    json_payload = '{{"name":"{}","members":"{}","type":"system","acls":[{{"permissions":64,"type":"default"}}]}}'.format(name, ip_addrs)
-    url = "https://cloud.tenable.com/target-groups"
-    headers = grab_headers()
-    r = requests.request(req_type, url, headers=headers, data=json_payload, verify=False)
-    
-    if r.status_code != 200:
-        print('Status:', r.status_code, 'Problem with the POST request to create target group. Exiting.')
-        sys.exit()
-
-    tgt_group_id = r.json()["id"]
-
-    return tgt_group_id
-
-def get_agent_only_ips():
+def get_agent_only_ips(scope):
 
     uri = '/workbenches/assets?date_range={}&filter.0.quality=set-hasonly&filter.0.filter=sources&filter.0.value=PVS&filter.search_type=and'.format(TIMEFRAME)
     data = get_data(uri)
     ip_addrs = []
+    fqdns = []
 
     for x in range(len(data["assets"])):
-        # Go through each configured connector and store it's settings.
-        for y in range(len(data["assets"][x]["ipv4"])):
-
-            ip_addr = data["assets"][x]["ipv4"][y]
-            try:
-                fqdn = data["assets"][x]["fqdn"][0]
-            except:
-                fqdn = ''
-
-            #print("IP: {}, FQDN: {}".format(ip_addr, fqdn))
-            if check_valid_target(ip_addr):
-                ip_addrs.append(agent_only_assets(ip_addr,fqdn))
-
-    return ip_addrs
-
-def check_valid_target(ip):
+        # Flatten every asset's IPs (with its FQDN) into one list.
+        try:
+            fqdn = data["assets"][x]["fqdn"][0]
+        except:
+            fqdn = ''
+
+        for ip_addr in data["assets"][x]["ipv4"]:
+            ip_addrs.append(ip_addr)
+            fqdns.append(fqdn)
+
+    # One pass over the whole list against the compiled scan scope.
+    return [agent_only_assets(ip_addrs[x], fqdns[x]) for x in scope.select(ip_addrs)]
+
+def get_scan_scope():
+    # The CIDR(s) passed in (or DEFAULT_SCAN_RANGE), limited to internal IPs,
+    # compiled once into a prefix_index.
     try:
         cidr = sys.argv[1]
     except:
-        cidr = "10.0.0.0/8,172.16.0.0/12,192.168.0.0/16"
-
-    if is_internal(ip):
-        if ',' in cidr:
-            for single_cidr in [x.strip() for x in cidr.split(',')]:
-                    if addressInNetwork(ip, single_cidr): # Check if IP is part of allowable scan range.
-                        return True
-        else:
-            if addressInNetwork(ip, cidr): # Check if IP is part of allowable scan range.
-                return True
-
-    return False
-
-def is_internal(ip):
-
-    from struct import unpack
-    from socket import AF_INET, inet_pton
-
-    # First we make sure that it's a private/internal IP address.
-    f = unpack('!I',inet_pton(AF_INET,ip))[0]
-    private = (
-        [ 2130706432, 4278190080 ], # 127.0.0.0,   255.0.0.0
-        [ 3232235520, 4294901760 ], # 192.168.0.0, 255.255.0.0
-        [ 2886729728, 4293918720 ], # 172.16.0.0,  255.240.0.0
-        [ 167772160,  4278190080 ], # 10.0.0.0,    255.0.0.0
-    ) 
-    for net in private: # If this IP address is an internal IP, proceed.
-        if (f & net[1]) == net[0]:
-            return True
-    
-    return False            
-
-def addressInNetwork(ip, net):
-    import socket,struct
+        cidr = DEFAULT_SCAN_RANGE
 
-    ipaddr = int(''.join([ '%02x' % int(x) for x in ip.split('.') ]), 16)
-    netstr, bits = net.split('/')
-    netaddr = int(''.join([ '%02x' % int(x) for x in netstr.split('.') ]), 16)
-    mask = (0xffffffff << (32 - int(bits))) & 0xffffffff
-
-    return (ipaddr & mask) == (netaddr & mask)
+    return scan_scope(cidr)
 
 def create_ip_list(agent_only_ips):
     # Now, agent_only_ips is an object, with a variable length, each having an IP+fqdn.
     # We will use this list to create the target group of IPs in Tenable.io
-    target_ips = ''
-    for x in range(len(agent_only_ips)):
-        if x == 0:
-            target_ips = agent_only_ips[x].ipv4
-        else:
-            target_ips = target_ips + ',' + agent_only_ips[x].ipv4
-
-    return target_ips
+    return build_members(ip.ipv4 for ip in agent_only_ips)
 
 def get_scanner_id():
-    scanners = get_data('/scanners')["scanners"]
+    scanners = cached_get_data('/scanners')["scanners"]
     scanner_id = 0
 
     for x in range(len(scanners)):
@@ -191,7 +89,7 @@ def get_scanner_id():
     return scanner_id
 
 def get_folder_id():
-    folders = get_data('/folders')["folders"]
+    folders = cached_get_data('/folders')["folders"]
     folder_id = 0
 
     for x in range(len(folders)):
@@ -203,7 +101,7 @@ def get_folder_id():
     return folder_id
 
 def get_template_id(name):
-    templates = get_data('/editor/scan/templates')["templates"]
+    templates = cached_get_data('/editor/scan/templates')["templates"]
     template_id = 0
 
     for x in range(len(templates)):
@@ -227,9 +125,7 @@ def run_basic_uncred_scan(target_group_id, timestamp):
     scan_name = "Agent Only Assets Remote Scan - {}".format(timestamp)
 
     json_payload = '{{"uuid":"{}","settings":{{"launch_now":true,"enabled":false,"file_targets":"","text_targets":"","asset_lists":["{}"],"scanner_id":"{}","use_dashboard":"","folder_id":{},"description":"","name":"{}"}}}}'.format(template_id, target_group_id, scanner_id, folder_id, scan_name)
-    url = "https://cloud.tenable.com/scans"
-    headers = grab_headers()
-    r = requests.request('POST', url, headers=headers, data=json_payload, verify=False)
+    r = get_client().request('POST', '/scans', data=json_payload)
     
     if r.status_code != 200:
         print('Status:', r.status_code, 'Problem with the POST request to create the new scan. Exiting.')
@@ -238,28 +134,16 @@ def run_basic_uncred_scan(target_group_id, timestamp):
     return True
 
 def tg_name_exists(tg_name):
-    target_groups = get_data('/target-groups')["target_groups"]
+    target_groups = cached_get_data('/target-groups')["target_groups"]
 
     for x in range(len(target_groups)):
         if tg_name == target_groups[x]["name"]:
-            return True
+            return target_groups[x]["id"]
 
-    return False
+    return 0
 
 def update_existing_tg(tg_id, ip_list, tg_name):
-    create_target_group('PUT', target_group_ips, target_group_name)
-
-   # This makes the POST request to build the target group on Tenable.io
-    json_payload = '{{"name":"{}","members":"{}","type":"system","acls":[{{"permissions":64,"type":"default"}}]}}'.format(name, ip_addrs)
-    url = "https://cloud.tenable.com/target-groups/{}".format(tg_id)            
-    headers = grab_headers()
-    r = requests.request(req_type, url, headers=headers, data=json_payload, verify=False)
-    
-    if r.status_code != 200:
-        print('Status:', r.status_code, 'Problem with the POST request to create target group. Exiting.')
-        sys.exit()
-
-    tgt_group_id = r.json()["id"]
+    tgt_group_id = create_target_group('PUT', ip_list, tg_name, tg_id)
 
     return tgt_group_id
 
@@ -286,7 +170,13 @@ def main():
     import datetime, time
     # First we grab all systems seen only by the Agents.
     try:
-        agent_only_ips = get_agent_only_ips()
+        scope = get_scan_scope()
+    except ValueError as e:
+        print('Invalid network range: {}'.format(e))
+        sys.exit(1)
+
+    try:
+        agent_only_ips = get_agent_only_ips(scope)
     except:
         print('Could not get asset details from Tenable.io... Quitting')
         sys.exit()
@@ -10,59 +10,11 @@
 # - python report_sched_scans.py 
 
 
-import json, requests
+import os
 import sys
-import pickle
 
-requests.packages.urllib3.disable_warnings()
-
-def save_keys():
-    #assumption is that the user keys didn't work or don't exsist
-    print("Please provide your Tenable.io User API keys.")
-    access_key = input("Please provide your Access Key (use quotes): ")
-    secret_key = input("Please provide your Secret Key (use quotes): ")
-
-    dicts = {"Access Key": access_key, "Secret Key": secret_key}
-
-    pickle_out = open("keys.pickle", "wb")
-    pickle.dump(dicts, pickle_out)
-    pickle_out.close()
-
-    print("Now you have keys, re-run your command")
-    sys.exit()
-
-def grab_headers():
-    import os
-
-    access_key = ''
-    secret_key = ''
-
-    #check for API keys; if none, get them from the user by calling save_keys()
-    if os.path.isfile('./keys.pickle') is False:
-        save_keys()
-    else:
-        pickle_in = open("keys.pickle", "rb")
-        keys = pickle.load(pickle_in)
-        access_key = keys["Access Key"]
-        secret_key = keys["Secret Key"]
-
-    #set the header
-    headers = {'Content-type':'application/json',
-               'X-ApiKeys':'accessKey='+access_key+';secretKey='+secret_key}
-    return headers
-
-def get_data(url_mod):
-    url = "https://cloud.tenable.com"
-    headers = grab_headers()
-    r = requests.request('GET', url + url_mod, headers=headers, verify=False)
-
-    if r.status_code != 200:
-        print('Status:', r.status_code, 'Problem with the initial GET request. Exiting.')
-        sys.exit()
-
-    data = r.json()
-
-    return data
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from tio_client import get_data
 
 class scan(object): # Object for storing existing connector details.
     def __init__(self, name, _type, status, rrules, starttime, timezone):
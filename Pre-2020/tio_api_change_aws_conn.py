@@ -17,11 +17,11 @@
 # - python tio_api_change_aws_conn.py 'AWS Connector 123' ACCESSCODE123 SECRETCODE123 
 #
 
-import json, requests
+import os
 import sys
-import pickle
 
-requests.packages.urllib3.disable_warnings()
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from tio_client import get_client, get_data
 
 class connector(object): # Object for storing existing connector details.
     def __init__(self, name, status, conn_id, conn_arn, trail_name):
@@ -37,53 +37,6 @@ class new_creds(object): # Object for temp storing new AWS creds.
         self.access = access
         self.secret = secret
 
-def save_keys():
-    #assumption is that the user keys didn't work or don't exsist
-    print("Please provide your Tenable.io User API keys.")
-    access_key = input("Please provide your Tenable.io Access Key (use quotes): ")
-    secret_key = input("Please provide your Tenable.io Secret Key (use quotes): ")
-
-    dicts = {"Access Key": access_key, "Secret Key": secret_key}
-
-    pickle_out = open("keys.pickle", "wb")
-    pickle.dump(dicts, pickle_out)
-    pickle_out.close()
-
-    print("Now you have keys, re-run your command")
-    sys.exit()
-
-def grab_headers():
-    import os
-
-    access_key = ''
-    secret_key = ''
-
-    #check for API keys; if none, get them from the user by calling save_keys()
-    if os.path.isfile('./keys.pickle') is False:
-        save_keys()
-    else:
-        pickle_in = open("keys.pickle", "rb")
-        keys = pickle.load(pickle_in)
-        access_key = keys["Access Key"]
-        secret_key = keys["Secret Key"]
-
-    #set the header
-    headers = {'Content-type':'application/json',
-               'X-ApiKeys':'accessKey='+access_key+';secretKey='+secret_key}
-    return headers
-
-def get_data(url_mod):
-    url = "https://cloud.tenable.com"
-    headers = grab_headers()
-    r = requests.request('GET', url + url_mod, headers=headers, verify=False)
-
-    if r.status_code != 200:
-        print('Status:', r.status_code, 'Problem with the initial GET request. Exiting.')
-        sys.exit()
-
-    data = r.json()
-    return data
-
 def get_connectors():
     data = get_data('/settings/connectors')
     connectors = []
@@ -101,9 +54,7 @@ def get_connectors():
 
 def put_connector_changes(connector_uuid, json_payload):
     # This makes the PUT request to replace credentials on T.io
-    url = "https://cloud.tenable.com/settings/connectors/"
-    headers = grab_headers()
-    r = requests.request('PUT', url + connector_uuid, headers=headers, data=json_payload, verify=False)
+    r = get_client().request('PUT', '/settings/connectors/' + connector_uuid, data=json_payload)
 
     if r.status_code != 200:
         print('Status:', r.status_code, 'Problem with the final PUT request. Exiting.')
@@ -115,7 +66,7 @@ def report_connector_options(connectors):
     # For all available connectors, this shows the name/status/ID for each.
     print('\nConnectors Available:')
     for x in range(len(connectors)):
-        print("{} - {}  (Status: {})  (ID: {})").format(x, connectors[x].name, connectors[x].status, connectors[x].conn_id)
+        print("{} - {}  (Status: {})  (ID: {})".format(x, connectors[x].name, connectors[x].status, connectors[x].conn_id))
 
 def get_connector_id_by_name(connectors, name):
     # This returns the UID of the connector when given a valid connector name.
@@ -147,7 +98,7 @@ def get_connector_obj_ref(connectors):
 
 def prompt_for_creds(name):
     # In case we're not provided the creds at runtime, we prompt for them here.
-    print("Changing authentication tokens for '{}'.").format(name)
+    print("Changing authentication tokens for '{}'.".format(name))
     access_key = raw_input(' Please provide your ACCESS key: ')
     secret_key = raw_input(' Please provide your SECRET key: ')
     ret = [access_key, secret_key]
@@ -167,10 +118,8 @@ def store_creds(name):
 
 def trigger_connector_import(uuid):
     # This makes the POST request to update the AWS connector status
-    url = "https://cloud.tenable.com/settings/connectors/"
     action = "/import"
-    headers = grab_headers()
-    r = requests.request('POST', url + uuid + action, headers=headers, verify=False)
+    r = get_client().request('POST', '/settings/connectors/' + uuid + action)
     # POST https://cloud.tenable.com/settings/connectors/6100a0f7-0101-4f13-8e60-90be93ca16c3/import
 
     if r.status_code != 200:
@@ -203,11 +152,11 @@ def change_stored_creds(connectors, creds):
             #print('Payload to be submitted:\n\n%s\n' % json_payload)
 
             if put_connector_changes(connector_uuid, json_payload):
-                print('The AWS credentials in Tenable.io have been replaced for "{}".').format(creds.name)
+                print('The AWS credentials in Tenable.io have been replaced for "{}".'.format(creds.name))
                 trigger_connector_import(connector_uuid)
                 outcome = True
             else:
-                print('An error occurred when changing the AWS credentials for "{}".').format(creds.name)
+                print('An error occurred when changing the AWS credentials for "{}".'.format(creds.name))
                 outcome = False
             break
 
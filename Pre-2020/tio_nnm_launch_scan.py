@@ -42,8 +42,14 @@ from tenable_io.client import TenableIOClient
 from tenable_io.api.scans import ScanCreateRequest
 from tenable_io.api.models import ScanSettings
 from tenable_io.api.models import Scan
+import os
 import sys
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from tio_cache import metadata_cache
+from tio_client import BASE_URL # Honours TIO_BASE_URL, like every other script.
+from tio_ipmatch import scan_scope
+
 REALTIME_LOG_PATH = "/opt/nnm/var/nnm/logs/realtime-logs.txt"
 ACCESSKEY = ''
 SECRETKEY = ''
@@ -52,7 +58,7 @@ SCANNER_NAME = 'tnsappliance-123456'
 FOLDER_NAME = "NNM Initiated Scans" # Will not auto-create folder. Must manually create in UI first.
 TEMPLATE_TYPE = 'basic'
 
-ALLOWED_SCAN_RANGE = '172.26.0.0/16' # Multiple scan ranges not yet supported.
+ALLOWED_SCAN_RANGE = '172.26.0.0/16' # Comma separate multiple ranges, e.g. '172.26.0.0/16,10.1.0.0/16'
 
 class Logger(object):
     def __init__(self, filename="Default.log"):
@@ -65,6 +71,7 @@ class Logger(object):
 
 sys.stdout = Logger("New_Host_Tracking_Log.txt")   # This creates a log file for all stdout to write to.
 tio_client = TenableIOClient(access_key=ACCESSKEY, secret_key=SECRETKEY)
+tio_cache = metadata_cache(scope=BASE_URL + '|' + ACCESSKEY) # Scanner/folder/template lookups survive between cron runs.
 
 def pygtail_check_logs():
 
@@ -99,52 +106,30 @@ def process_log(line):
         init_scan(new_host_ip, timestamp)
 
 def check_valid_target(ip):
-
-    from struct import unpack
-    from socket import AF_INET, inet_pton
-    import ipaddress
-
-    # First we make sure that it's a private/internal IP address.
-    f = unpack('!I',inet_pton(AF_INET,ip))[0]
-    private = (
-        [ 2130706432, 4278190080 ], # 127.0.0.0,   255.0.0.0
-        [ 3232235520, 4294901760 ], # 192.168.0.0, 255.255.0.0
-        [ 2886729728, 4293918720 ], # 172.16.0.0,  255.240.0.0
-        [ 167772160,  4278190080 ], # 10.0.0.0,    255.0.0.0
-    ) 
-    for net in private: # If this IP address is an internal IP, proceed.
-        if (f & net[1]) == net[0]:
-            if addressInNetwork(ip, ALLOWED_SCAN_RANGE): # Check if IP is part of allowable scan range.
-                return True
-    return False
-
-def addressInNetwork(ip, net):
-   import socket,struct
-   
-   ipaddr = int(''.join([ '%02x' % int(x) for x in ip.split('.') ]), 16)
-   netstr, bits = net.split('/')
-   netaddr = int(''.join([ '%02x' % int(x) for x in netstr.split('.') ]), 16)
-   mask = (0xffffffff << (32 - int(bits))) & 0xffffffff
-   
-   return (ipaddr & mask) == (netaddr & mask)
+    # Only internal (RFC-1918) IPs inside ALLOWED_SCAN_RANGE. The ranges are compiled once, not per line.
+    return scan_scope(ALLOWED_SCAN_RANGE).contains(ip)
 
 def init_scan(new_host_ip, timestamp):
     # Fetch a list of all scanners on the account and group them into a dictionary {scannerName: scannerId}
-    scanners = {scanner.name: scanner.id for scanner in tio_client.scanners_api.list().scanners}
+    # Cached under its own key: '/scanners' holds the raw API response for cached_get_data().
+    scanners = tio_cache.get('/scanners#by_name', lambda: {scanner.name: scanner.id for scanner in tio_client.scanners_api.list().scanners},
+                             ttl=tio_cache.ttl('/scanners'))
 
     # Fetch a list of all folders on the account and group them into a dictionary {folderName: folderId}
-    folders = {folder.name: folder.id for folder in tio_client.folders_api.list().folders}
+    folders = tio_cache.get('/folders#by_name', lambda: {folder.name: folder.id for folder in tio_client.folders_api.list().folders},
+                            ttl=tio_cache.ttl('/folders'))
 
     # This controls the name formatting for the automatically generated scan.
     scan_name = 'NNM Initiated Scan - New Host %s @ %s' % (new_host_ip, timestamp)
 
     # This controls which template is used, see the 'TEMPLATE_TYPE' variable at the top.
-    basic_template = tio_client.scan_helper.template(name=TEMPLATE_TYPE)
+    template_uuid = tio_cache.get('/editor/scan/templates#' + TEMPLATE_TYPE, lambda: tio_client.scan_helper.template(name=TEMPLATE_TYPE).uuid,
+                                  ttl=tio_cache.ttl('/editor/scan/templates'))
 
     # Create the scan and use the corresponding scanner id for the scanner name supplied
     scan_id = tio_client.scans_api.create(
         ScanCreateRequest(
-            basic_template.uuid,
+            template_uuid,
             ScanSettings(
                 scan_name,
                 new_host_ip,
@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+#
+# Notes:
+# Benchmarks for the hot paths of the scripts in this repo, run entirely
+# offline against mock_tio_server.py and its synthetic dataset. Each benchmark
+# is timed --repeat times and the best run is kept. Results are written as
+# JSON, and if a baseline file is given each result is compared against it,
+# so you can tell whether a change actually made the nightly jobs faster.
+#
+# Author: ThisTooShallXSS (https://github.com/thistooshallxss)
+# Requirements: Python 3.7+, requests, aiohttp, numpy (optional), pytenable (report_findings only)
+#
+# Usage:
+# - python benchmarks/run_benchmarks.py
+# - python benchmarks/run_benchmarks.py --output before.json
+# - python benchmarks/run_benchmarks.py --baseline before.json --output after.json
+# - python benchmarks/run_benchmarks.py --only ip_match --scale 0.1
+#
+# Exits non-zero if any benchmark is more than --fail-threshold percent slower
+# than the baseline.
+
+import argparse
+import contextlib
+import importlib.util
+import io
+import ipaddress
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.join(REPO_ROOT, 'Pre-2020'))
+
+DEFAULT_OUTPUT = 'bench_results.json'
+BENCHMARKS = []
+
+class bench(object): # One registered benchmark: an optional setup, and a timed body.
+    def __init__(self, name, body, setup=None, needs=None):
+        self.name = name
+        self.body = body
+        self.setup = setup
+        self.needs = needs # Module that must import for this benchmark to run.
+
+def benchmark(name, setup=None, needs=None):
+    # Decorator. The body receives whatever setup(ctx) returned and must return
+    # the number of operations it performed (IPs matched, assets deleted, ...).
+    # Anything the body needs, modules included, comes from setup, which isn't
+    # timed, so the first repeat doesn't pay for imports.
+    def register(body):
+        BENCHMARKS.append(bench(name, body, setup, needs))
+        return body
+    return register
+
+def load_script(filename, module_name):
+    # The root scripts have hyphens in their names, so import them by path.
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(REPO_ROOT, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def with_module(module_name, make_arg):
+    # Setup that imports module_name (untimed) and passes it to the body
+    # together with make_arg(ctx).
+    return lambda ctx: (importlib.import_module(module_name), make_arg(ctx))
+
+def synthetic_ips(count, seed=7):
+    rng = random.Random(seed)
+    networks = [ipaddress.ip_network(n) for n in ('10.0.0.0/8', '172.16.0.0/12', '192.168.0.0/16', '198.51.100.0/24')]
+    ips = []
+    for x in range(count):
+        net = networks[rng.randrange(len(networks))]
+        ips.append(str(net[rng.randrange(net.num_addresses)]))
+    return ips
+
+class bench_context(object): # Shared state: sizes, and the mock server everything talks to.
+    def __init__(self, args):
+        import mock_tio_server
+
+        self.scale = args.scale
+        self.assets = max(100, int(args.assets * args.scale))
+        self.findings_per_asset = args.findings_per_asset
+
+        # page_size covers the whole dataset so unpaginated workbench calls see every asset.
+        self.server, self.base_url = mock_tio_server.start_server(
+            assets=self.assets, findings_per_asset=self.findings_per_asset,
+            latency=args.latency, page_size=max(self.assets, mock_tio_server.DEFAULT_PAGE_SIZE), export_delay=0)
+
+    def size(self, count):
+        return max(10, int(count * self.scale))
+
+    def reset_dataset(self):
+        import mock_tio_server
+
+        self.server.state.data = mock_tio_server.synthetic_dataset(1, self.assets, self.findings_per_asset)
+
+# -- benchmarks ---------------------------------------------------------------
+
+@benchmark('ip_match_addressInNetwork', setup=with_module('delete_assets_large', lambda ctx: synthetic_ips(ctx.size(200000))))
+def bench_address_in_network(args):
+    delete_assets_large, ips = args
+
+    for ip in ips:
+        delete_assets_large.addressInNetwork(ip, '10.0.0.0/8')
+    return len(ips)
+
+@benchmark('ip_match_is_internal', setup=with_module('agent_group_tg_generator', lambda ctx: synthetic_ips(ctx.size(200000))))
+def bench_is_internal(args):
+    agent_group_tg_generator, ips = args
+
+    for ip in ips:
+        agent_group_tg_generator.is_internal(ip)
+    return len(ips)
+
+@benchmark('ip_match_cidr_matcher_select', setup=with_module('tio_ipmatch', lambda ctx: synthetic_ips(ctx.size(1000000))))
+def bench_cidr_matcher_select(args):
+    tio_ipmatch, ips = args
+
+    tio_ipmatch.cidr_matcher('10.0.0.0/8,172.16.0.0/12,192.168.16.0/20').select(ips)
+    return len(ips)
+
+@benchmark('member_list_create_comma_sep_list', setup=with_module('tag_tg_generator', lambda ctx: synthetic_ips(ctx.size(50000))))
+def bench_create_comma_sep_list(args):
+    tag_tg_generator, ips = args
+
+    tag_tg_generator.create_comma_sep_list(ips)
+    return len(ips)
+
+@benchmark('find_matching_hosts', setup=with_module('delete_assets_small', lambda ctx: ctx))
+def bench_find_matching_hosts(args):
+    delete_assets_small, ctx = args
+
+    delete_assets_small.find_matching_hosts('10.0.0.0/8')
+    return len(ctx.server.state.data.assets)
+
+def setup_purge(ctx):
+    ctx.reset_dataset()
+    return list(ctx.server.state.data.assets)[:ctx.size(5000)]
+
+@benchmark('purge_assets', setup=with_module('delete_assets_small', setup_purge))
+def bench_purge_assets(args):
+    delete_assets_small, uuids = args
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        delete_assets_small.purge_assets(uuids)
+    return len(uuids)
+
+def setup_export(ctx):
+    import tio_client
+
+    payload = {'name': 'bench', 'source': 'findings/vulnerabilities/host', 'format': 'json',
+               'definition': {'fields': ['id', 'severity', 'state', 'asset.id', 'definition.id', 'definition.vpr.score']}}
+    export_uuid = tio_client.get_client().request('POST', '/api/v3/exports/jobs', json=payload).json()['id']
+    return export_uuid
+
+@benchmark('export_download_parse', setup=with_module('tio_exports', setup_export))
+def bench_export_download_parse(args):
+    tio_exports, export_uuid = args
+
+    return sum(1 for record in tio_exports.iter_export_records(export_uuid))
+
+def setup_report_findings(ctx):
+    agent_vulns = load_script('pytenable-tio-agent-search-vulns.py', 'agent_search_vulns')
+    return agent_vulns, ctx.server.state.data.findings[:ctx.size(20000)]
+
+@benchmark('report_findings', setup=setup_report_findings, needs='tenable.io')
+def bench_report_findings(args):
+    agent_vulns, findings = args
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        agent_vulns.report_findings(iter(findings))
+    return len(findings)
+
+# -- runner -------------------------------------------------------------------
+
+def run_one(b, ctx, repeat):
+    timings = []
+    ops = 0
+
+    for x in range(repeat):
+        arg = b.setup(ctx) if b.setup else ctx
+        start = time.perf_counter()
+        ops = b.body(arg)
+        timings.append(time.perf_counter() - start)
+
+    best = min(timings)
+    return {'ops': ops, 'best_seconds': best, 'median_seconds': sorted(timings)[len(timings) // 2],
+            'ops_per_sec': ops / best if best > 0 else None, 'repeat': repeat}
+
+def compare(results, baseline, threshold):
+    # Prints a before/after table. Returns the names that regressed past threshold.
+    regressed = []
+    print('\n{:<36} {:>14} {:>14} {:>9}'.format('benchmark', 'baseline op/s', 'current op/s', 'change'))
+
+    for name in sorted(results):
+        now = results[name].get('ops_per_sec')
+        before = baseline.get(name, {}).get('ops_per_sec')
+
+        if not now or not before:
+            print('{:<36} {:>14} {:>14} {:>9}'.format(name, before or '-', round(now or 0, 1), 'n/a'))
+            continue
+
+        change = (now - before) / before * 100
+        print('{:<36} {:>14.1f} {:>14.1f} {:>+8.1f}%'.format(name, before, now, change))
+
+        if change < -threshold:
+            regressed.append(name)
+
+    return regressed
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the hot paths of the tio_automation scripts.')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help='Where to write the JSON results.')
+    parser.add_argument('--baseline', help='Earlier results file to compare against.')
+    parser.add_argument('--fail-threshold', type=float, default=10.0, help='Percent slowdown that counts as a regression.')
+    parser.add_argument('--only', help='Only run benchmarks whose name contains this string.')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--scale', type=float, default=1.0, help='Multiplier for every benchmark size.')
+    parser.add_argument('--assets', type=int, default=20000, help='Assets in the mock dataset (before --scale).')
+    parser.add_argument('--findings-per-asset', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.0, help='Per-request latency for the mock server.')
+    args = parser.parse_args()
+
+    ctx = bench_context(args)
+
+    # Point every client at the mock, with throwaway keys and no client-side rate limit.
+    os.environ['TIO_BASE_URL'] = ctx.base_url
+    os.environ['TIO_ACCESS_KEY'] = 'bench'
+    os.environ['TIO_SECRET_KEY'] = 'bench'
+    os.environ['TIO_RATE'] = '100000'
+    os.environ['TIO_BURST'] = '100000'
+
+    results = {}
+    for b in BENCHMARKS:
+        if args.only and args.only not in b.name:
+            continue
+
+        if b.needs and importlib.util.find_spec(b.needs.split('.')[0]) is None:
+            print('{:<36} skipped ({} is not installed)'.format(b.name, b.needs))
+            continue
+
+        results[b.name] = run_one(b, ctx, args.repeat)
+        print('{:<36} {:>12.1f} ops/s  (best {:.3f}s for {} ops)'.format(
+            b.name, results[b.name]['ops_per_sec'] or 0, results[b.name]['best_seconds'], results[b.name]['ops']))
+
+    report = {'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+              'settings': vars(args), 'results': results}
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print('\nResults written to {}'.format(args.output))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+
+        regressed = compare(results, baseline, args.fail_threshold)
+        if regressed:
+            print('\nSlower than baseline by more than {}%: {}'.format(args.fail_threshold, ', '.join(regressed)))
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
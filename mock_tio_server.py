@@ -0,0 +1,680 @@
+#!/usr/bin/env python
+#
+# Notes:
+# A local stand-in for cloud.tenable.com, so the scripts in this repo can be
+# benchmarked and load-tested without touching production. It serves the
+# endpoints those scripts use, backed by a synthetic dataset generated from a
+# seed (same seed and day, same data), and can add per-request latency and inject
+# HTTP 429 responses to exercise the retry/backoff paths. Export downloads
+# support Range requests and send an MD5 ETag, and --drop-rate cuts some of
+# them off halfway to exercise resumable downloads.
+#
+# Endpoints: /workbenches/assets (+ /vulnerabilities, DELETE /{uuid}),
+# /api/v2/assets/bulk-jobs/delete,
+# /target-groups, /scanners (+ /agent-groups, /agents), /folders, /scans,
+# /editor/scan/templates, /tags/values, /plugins/plugin/{id}, /filters/scans/agents,
+# /api/v3/exports/jobs (+ /{id}, /{id}/content, /{id}/chunks/{n}), /api/v3/assets/search,
+# /api/v3/assets/host/search and /api/v3/findings/vulnerabilities/host/search
+#
+# Author: ThisTooShallXSS (https://github.com/thistooshallxss)
+# Requirements: Python 3.7+ (standard library only)
+#
+# Usage:
+# - python mock_tio_server.py                                   # http://127.0.0.1:8080, 5000 assets
+# - python mock_tio_server.py --assets 200000 --latency 0.05 --throttle-rate 0.02
+#
+# Then point any script at it:
+# - TIO_BASE_URL=http://127.0.0.1:8080 TIO_ACCESS_KEY=x TIO_SECRET_KEY=x python Pre-2020/tag_tg_generator.py
+#
+# From Python (e.g. a benchmark), start_server() runs it on a background thread:
+# - server, base_url = start_server(port=0, assets=20000)
+
+import argparse
+import datetime
+import hashlib
+import ipaddress
+import json
+import random
+import re
+import threading
+import time
+import uuid
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+DEFAULT_ASSETS = 5000
+DEFAULT_FINDINGS_PER_ASSET = 5
+DEFAULT_PAGE_SIZE = 5000 # Largest page any list endpoint will return.
+DEFAULT_EXPORT_DELAY = 2.0 # Seconds before a new export job reports FINISHED.
+DEFAULT_EXPORT_CHUNK_SIZE = 5000 # Records per export chunk. Chunks become available one by one during export_delay.
+
+TAG_VALUES = {
+    'Location': ['Boston', 'Columbia', 'London', 'Singapore'],
+    'Environment': ['Production', 'Staging', 'Development'],
+    'BusinessUnit': ['Finance', 'Engineering', 'Sales', 'HR', 'IT'],
+}
+SEVERITY_NAMES = {'Info': 0, 'Low': 1, 'Medium': 2, 'High': 3, 'Critical': 4}
+SOURCES = ['NESSUS_AGENT', 'NESSUS_SCAN', 'PVS']
+STATES = ['ACTIVE', 'NEW', 'RESURFACED', 'FIXED']
+NETWORKS = ['10.0.0.0/8', '172.16.0.0/12', '192.168.0.0/16', '203.0.113.0/24']
+
+class synthetic_dataset(object): # Deterministic fake container contents.
+    def __init__(self, seed=1, assets=DEFAULT_ASSETS, findings_per_asset=DEFAULT_FINDINGS_PER_ASSET, agent_groups=8):
+        rng = random.Random(seed)
+        # Timestamps are relative to the start of today (UTC), so filters that
+        # clients compute from the real clock ("seen in the last 30 days") work.
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None, hour=0, minute=0, second=0, microsecond=0)
+        self.now = now
+        new_uuid = lambda: str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+        self.tags = []
+        for category in sorted(TAG_VALUES):
+            for value in TAG_VALUES[category]:
+                self.tags.append({'uuid': new_uuid(), 'category_name': category, 'value': value, 'type': 'static'})
+
+        self.agent_groups = [{'id': 100 + x, 'name': 'Agent Group {}'.format(x)} for x in range(agent_groups)]
+        self.scanners = [
+            {'id': 1, 'uuid': new_uuid(), 'name': 'US Cloud Scanner', 'type': 'managed'},
+            {'id': 2, 'uuid': new_uuid(), 'name': 'tnsappliance-123456', 'type': 'local'},
+        ]
+        self.folders = [{'id': 3, 'name': 'My Scans', 'type': 'main'}, {'id': 4, 'name': 'NNM Initiated Scans', 'type': 'custom'}]
+        self.templates = [{'name': name, 'uuid': new_uuid()} for name in ['basic', 'advanced', 'discovery', 'agent_basic']]
+        self.scans = [{'id': 4111, 'name': 'Daily Agent Scan', 'type': 'agent', 'status': 'completed', 'enabled': True,
+                       'rrules': 'FREQ=DAILY;INTERVAL=1', 'starttime': '20260101T040000', 'timezone': 'US/Eastern'}]
+        self.target_groups = {}
+        self.next_tg_id = 1
+
+        networks = [ipaddress.ip_network(n) for n in NETWORKS]
+        self.assets = {}
+        self.findings = []
+
+        for n in range(assets):
+            net = networks[rng.randrange(len(networks))]
+            ip = str(net[rng.randrange(1, net.num_addresses - 1)])
+            sources = sorted(rng.sample(SOURCES, rng.randint(1, len(SOURCES))))
+            last_seen = now - datetime.timedelta(days=rng.randint(0, 120), seconds=rng.randint(0, 86399))
+            tags = rng.sample(self.tags, rng.randint(0, 3))
+            has_agent = 'NESSUS_AGENT' in sources
+            name = 'host{:06d}'.format(n)
+
+            asset = {
+                'id': new_uuid(),
+                'tenable_id': '{:032x}'.format(rng.getrandbits(128)),
+                'has_agent': has_agent,
+                'agent_name': [name] if has_agent else [],
+                'agent_group': self.agent_groups[n % len(self.agent_groups)]['id'] if has_agent else None,
+                'ipv4': [ip],
+                'ipv6': [],
+                'fqdn': ['{}.example.com'.format(name)],
+                'netbios_name': [name.upper()],
+                'sources': sources,
+                'last_seen': last_seen.strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+                'first_seen': (last_seen - datetime.timedelta(days=rng.randint(0, 365))).strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+                'tags': tags,
+                'is_licensed': True,
+            }
+            self.assets[asset['id']] = asset
+
+            for y in range(findings_per_asset):
+                plugin_id = rng.randint(10000, 200000)
+                severity = rng.choice([0, 1, 1, 2, 2, 2, 3, 3, 4])
+                observed = last_seen - datetime.timedelta(hours=rng.randint(0, 72))
+                self.findings.append({
+                    'id': new_uuid(),
+                    'asset': {'id': asset['id'], 'name': name, 'agent_name': name if has_agent else None,
+                              'host_ips': [ip], 'display_ipv4_address': ip, 'tenable_id': asset['tenable_id']},
+                    'severity': severity,
+                    'state': rng.choice(STATES),
+                    'port': rng.choice([0, 22, 80, 443, 445, 3389]),
+                    'protocol': rng.choice(['TCP', 'UDP']),
+                    'output': 'Synthetic plugin output for plugin {}'.format(plugin_id),
+                    'first_observed': (observed - datetime.timedelta(days=rng.randint(0, 90))).strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+                    'last_observed': observed.strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+                    'definition': {
+                        'id': plugin_id,
+                        'name': 'Synthetic Plugin {}'.format(plugin_id),
+                        'family': rng.choice(['General', 'Windows', 'Ubuntu Local Security Checks', 'Web Servers']),
+                        'severity': severity,
+                        'vpr': {'score': round(rng.uniform(0, 10), 1)},
+                        'cvss3': {'base_score': round(rng.uniform(0, 10), 1)},
+                    },
+                })
+
+    def asset_ips(self, asset):
+        return [ipaddress.ip_address(ip) for ip in asset['ipv4']]
+
+    def agents(self):
+        # The agent records /scanners/{id}/agents returns, one per agent asset.
+        for asset in self.assets.values():
+            if asset['has_agent']:
+                yield {'id': asset['tenable_id'][:8], 'uuid': str(uuid.UUID(asset['tenable_id'])),
+                       'name': asset['agent_name'][0], 'ip': asset['ipv4'][0],
+                       'groups': [{'id': asset['agent_group']}], 'status': 'on'}
+
+class mock_state(object): # Server-wide settings plus the mutable dataset.
+    def __init__(self, dataset, latency=0.0, jitter=0.0, page_size=DEFAULT_PAGE_SIZE,
+                 throttle_rate=0.0, retry_after=1, export_delay=DEFAULT_EXPORT_DELAY, seed=1,
+                 export_chunk_size=DEFAULT_EXPORT_CHUNK_SIZE, drop_rate=0.0):
+        self.data = dataset
+        self.latency = latency
+        self.jitter = jitter
+        self.page_size = page_size
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.export_delay = export_delay
+        self.export_chunk_size = export_chunk_size
+        self.drop_rate = drop_rate
+        self.dropped = 0
+        self.exports = {}
+        self.requests = 0
+        self.throttled = 0
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+def _parse_time(value):
+    return datetime.datetime.strptime(value[:19], '%Y-%m-%dT%H:%M:%S')
+
+def _lookup(record, prop):
+    # Resolves a dotted v3 property name like "definition.vpr.score". Like the
+    # real API, names aren't case sensitive ("Id").
+    for part in prop.split('.'):
+        if not isinstance(record, dict):
+            return None
+        if part not in record:
+            part = next((k for k in record if k.lower() == part.lower()), part)
+        record = record.get(part)
+    return record
+
+def _matches_v3(record, condition):
+    if 'and' in condition:
+        return all(_matches_v3(record, c) for c in condition['and'])
+    if 'or' in condition:
+        return any(_matches_v3(record, c) for c in condition['or'])
+
+    actual = _lookup(record, condition['property'])
+    raw = condition['value'] if isinstance(condition['value'], list) else [condition['value']]
+    wanted = [str(w).lower() for w in raw]
+    actual = actual if isinstance(actual, list) else [actual]
+    operator = condition.get('operator', 'eq')
+
+    if operator == 'eq':
+        return any(str(a).lower() in wanted for a in actual)
+    if operator == 'neq':
+        return not any(str(a).lower() in wanted for a in actual)
+    if operator in ('gt', 'gte', 'lt', 'lte'):
+        for a in actual:
+            if a is None:
+                continue
+            a, w = str(a), str(raw[0]) # Timestamps compare as-is: lowercasing the "T" would break ordering.
+            if (operator == 'gt' and a > w) or (operator == 'gte' and a >= w) or \
+               (operator == 'lt' and a < w) or (operator == 'lte' and a <= w):
+                return True
+        return False
+
+    return True
+
+def _matches_bulk(data, asset, query):
+    # Bulk job queries: {"and"|"or": [...]} or {"field", "operator", "value"}.
+    if 'and' in query:
+        return all(_matches_bulk(data, asset, q) for q in query['and'])
+    if 'or' in query:
+        return any(_matches_bulk(data, asset, q) for q in query['or'])
+
+    values = [v.strip() for v in str(query.get('value', '')).split(',')]
+    if query.get('field') == 'host.id':
+        return asset['id'] in values
+    if query.get('field') == 'ipv4':
+        networks = [ipaddress.ip_network(v, strict=False) for v in values]
+        return any(ip in net for ip in data.asset_ips(asset) for net in networks)
+    return False
+
+def _project(record, fields):
+    # Builds the nested JSON a v3 export/search returns for the requested fields.
+    if not fields:
+        return record
+
+    out = {}
+    for field in fields:
+        value = _lookup(record, field)
+        target = out
+        parts = field.lower().split('.') # The API answers with its own (lowercase) names.
+        for part in parts[:-1]:
+            target = target.setdefault(part, {})
+        target[parts[-1]] = value
+
+    return out
+
+class mock_handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1' # Keep-alive, like the real API.
+    state = None
+
+    def log_message(self, *args):
+        pass
+
+    # -- plumbing ---------------------------------------------------------
+
+    def _send(self, status, body=None, headers=None):
+        payload = b'' if body is None else (body if isinstance(body, bytes) else json.dumps(body).encode())
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _send_download(self, payload):
+        # Export content: honours "Range: bytes=N-", sends an MD5 ETag, and
+        # (at drop_rate) sends only half the body before closing the connection.
+        etag = '"{}"'.format(hashlib.md5(payload).hexdigest())
+        start = 0
+        match = re.match(r'bytes=(\d+)-$', self.headers.get('Range') or '')
+
+        if match:
+            start = int(match.group(1))
+            if start >= len(payload):
+                return self._send(416, None, {'Content-Range': 'bytes */{}'.format(len(payload))})
+
+        body = payload[start:]
+        self.send_response(206 if match else 200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('ETag', etag)
+        if match:
+            self.send_header('Content-Range', 'bytes {}-{}/{}'.format(start, len(payload) - 1, len(payload)))
+        self.end_headers()
+
+        with self.state.lock:
+            drop = self.state.drop_rate > 0 and len(body) > 1 and self.state.rng.random() < self.state.drop_rate
+            if drop:
+                self.state.dropped += 1
+
+        if drop:
+            self.wfile.write(body[:len(body) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+
+        self.wfile.write(body)
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length) if length else b''
+        return json.loads(raw) if raw else {}
+
+    def _dispatch(self, method):
+        state = self.state
+        parsed = urlparse(self.path)
+        query = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+
+        with state.lock:
+            state.requests += 1
+            throttle = state.throttle_rate > 0 and state.rng.random() < state.throttle_rate
+            if throttle:
+                state.throttled += 1
+
+        if state.latency or state.jitter:
+            time.sleep(state.latency + random.uniform(0, state.jitter))
+
+        if not self.headers.get('X-ApiKeys'):
+            self._body()
+            return self._send(401, {'error': 'Missing X-ApiKeys header'})
+
+        if throttle:
+            self._body()
+            return self._send(429, {'error': 'Too Many Requests'}, {'Retry-After': str(state.retry_after)})
+
+        for route_method, pattern, handler in ROUTES:
+            match = re.match(pattern + '$', parsed.path)
+            if route_method == method and match:
+                return handler(self, query, *match.groups())
+
+        self._body()
+        self._send(404, {'error': 'No mock for {} {}'.format(method, parsed.path)})
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def do_PUT(self):
+        self._dispatch('PUT')
+
+    def do_DELETE(self):
+        self._dispatch('DELETE')
+
+    def _page(self, records, query):
+        offset = int(query.get('offset', 0))
+        limit = min(int(query.get('limit', self.state.page_size)), self.state.page_size)
+        return records[offset:offset + limit], offset, limit
+
+    # -- v2 / workbench endpoints -------------------------------------------
+
+    def _filtered_assets(self, query):
+        data = self.state.data
+        assets = list(data.assets.values())
+
+        date_range = int(query.get('date_range', 0))
+        if date_range:
+            cutoff = data.now - datetime.timedelta(days=date_range)
+            assets = [a for a in assets if _parse_time(a['last_seen']) >= cutoff]
+
+        x = 0
+        while 'filter.{}.filter'.format(x) in query:
+            name = query['filter.{}.filter'.format(x)]
+            quality = query.get('filter.{}.quality'.format(x), 'eq')
+            value = query.get('filter.{}.value'.format(x), '')
+
+            if name.startswith('tag.'):
+                category = name[4:]
+                assets = [a for a in assets if any(t['category_name'] == category and t['value'] == value for t in a['tags'])]
+            elif name == 'target_group':
+                tg = data.target_groups.get(int(value))
+                members = [ipaddress.ip_network(m.strip(), strict=False) for m in tg['members'].split(',') if m.strip()] if tg else []
+                assets = [a for a in assets if any(ip in net for ip in data.asset_ips(a) for net in members)]
+            elif name == 'sources':
+                wanted = set(value.split(','))
+                if quality == 'set-hasonly':
+                    assets = [a for a in assets if set(a['sources']) <= wanted]
+                else:
+                    assets = [a for a in assets if set(a['sources']) & wanted]
+            elif name == 'ipv4':
+                net = ipaddress.ip_network(value, strict=False)
+                assets = [a for a in assets if any(ip in net for ip in data.asset_ips(a))]
+            x += 1
+
+        return assets
+
+    def _workbench_asset(self, asset):
+        return {'id': asset['id'], 'has_agent': asset['has_agent'], 'last_seen': asset['last_seen'],
+                'sources': [{'name': s, 'first_seen': asset['first_seen'], 'last_seen': asset['last_seen']} for s in asset['sources']],
+                'ipv4': asset['ipv4'], 'ipv6': asset['ipv6'], 'fqdn': asset['fqdn'],
+                'netbios_name': asset['netbios_name'], 'agent_name': asset['agent_name']}
+
+    def workbench_assets(self, query):
+        assets = self._filtered_assets(query)
+        page, offset, limit = self._page(assets, query)
+        self._send(200, {'assets': [self._workbench_asset(a) for a in page], 'total': len(assets)})
+
+    def workbench_vulns(self, query):
+        # Only the severity filter is honored here; that's all tg_severity_generator.py sends.
+        severity = SEVERITY_NAMES.get(query.get('filter.0.value'), None)
+        asset_ids = set(f['asset']['id'] for f in self.state.data.findings if severity is None or f['severity'] == severity)
+        assets = [a for a in self._filtered_assets({'date_range': query.get('date_range', 0)}) if a['id'] in asset_ids]
+        page, offset, limit = self._page(assets, query)
+        self._send(200, {'assets': [self._workbench_asset(a) for a in page], 'total': len(assets)})
+
+    def delete_workbench_asset(self, query, asset_id):
+        with self.state.lock:
+            removed = self.state.data.assets.pop(asset_id, None)
+        self._send(202 if removed else 404, {} if removed else {'error': 'Asset not found'})
+
+    def bulk_delete_assets(self, query):
+        # Supports the host.id / ipv4 'eq' filters, combined with 'and' / 'or'.
+        body = self._body().get('query') or {}
+        leaves = body.get('or') or []
+
+        with self.state.lock:
+            if leaves and all(q.get('field') == 'host.id' and q.get('operator') == 'eq' for q in leaves):
+                # Fast path for the UUID list bulk_delete_assets() sends.
+                ids = set(v.strip() for q in leaves for v in str(q.get('value', '')).split(','))
+                doomed = [self.state.data.assets[i] for i in ids if i in self.state.data.assets]
+            else:
+                doomed = [a for a in self.state.data.assets.values() if _matches_bulk(self.state.data, a, body)]
+            for asset in doomed:
+                del self.state.data.assets[asset['id']]
+
+        self._send(202, {'response': {'data': {'asset_count': len(doomed)}}})
+
+    def list_target_groups(self, query):
+        self._send(200, {'target_groups': list(self.state.data.target_groups.values())})
+
+    def create_target_group(self, query, tg_id=None):
+        body = self._body()
+        data = self.state.data
+
+        with self.state.lock:
+            if tg_id is None:
+                tg_id = data.next_tg_id
+                data.next_tg_id += 1
+            elif int(tg_id) not in data.target_groups:
+                return self._send(404, {'error': 'Target group not found'})
+
+            tg = {'id': int(tg_id), 'name': body.get('name'), 'members': body.get('members', ''),
+                  'type': body.get('type', 'system'), 'acls': body.get('acls', [])}
+            data.target_groups[int(tg_id)] = tg
+
+        self._send(200, tg)
+
+    def list_scanners(self, query):
+        self._send(200, {'scanners': self.state.data.scanners})
+
+    def list_agent_groups(self, query, scanner_id):
+        self._send(200, {'groups': self.state.data.agent_groups})
+
+    def list_agents(self, query, scanner_id):
+        agents = list(self.state.data.agents())
+
+        # pyTenable/UI style filters, e.g. f=groups:eq:101 or f=name:match:host0001
+        for f in parse_qs(urlparse(self.path).query).get('f', []):
+            prop, operator, value = f.split(':', 2)
+            if prop == 'groups':
+                agents = [a for a in agents if any(str(g['id']) == value for g in a['groups'])]
+            elif prop == 'name' and operator == 'eq':
+                agents = [a for a in agents if value.lower() == a['name'].lower()]
+            elif prop == 'name':
+                agents = [a for a in agents if value.lower() in a['name'].lower()]
+
+        page, offset, limit = self._page(agents, query)
+        self._send(200, {'agents': page, 'pagination': {'total': len(agents), 'offset': offset, 'limit': limit}})
+
+    def agent_filters(self, query):
+        # What pyTenable's tio.agents.list() validates its filters against.
+        # Only the filters list_agents() understands are offered.
+        groups = [{'id': g['id'], 'name': g['name']} for g in self.state.data.agent_groups]
+        self._send(200, {'filters': [
+            {'name': 'name', 'readable_name': 'Agent Name', 'operators': ['eq', 'match'],
+             'control': {'type': 'entry', 'regex': '.*'}},
+            {'name': 'groups', 'readable_name': 'Member of Group', 'operators': ['eq'],
+             'control': {'type': 'dropdown', 'list': groups}},
+        ]})
+
+    def list_folders(self, query):
+        self._send(200, {'folders': self.state.data.folders})
+
+    def list_scans(self, query):
+        self._send(200, {'scans': self.state.data.scans})
+
+    def create_scan(self, query):
+        settings = self._body().get('settings', {})
+        with self.state.lock:
+            scan = {'id': 5000 + len(self.state.data.scans), 'name': settings.get('name'), 'type': 'remote',
+                    'status': 'pending', 'enabled': False, 'rrules': None, 'starttime': None, 'timezone': None}
+            self.state.data.scans.append(scan)
+        self._send(200, {'scan': scan})
+
+    def list_templates(self, query):
+        self._send(200, {'templates': self.state.data.templates})
+
+    def list_tag_values(self, query):
+        tags = self.state.data.tags
+        page, offset, limit = self._page(tags, query)
+        self._send(200, {'values': page, 'pagination': {'total': len(tags), 'offset': offset, 'limit': limit}})
+
+    def plugin_details(self, query, plugin_id):
+        self._send(200, {'id': int(plugin_id), 'name': 'Synthetic Plugin {}'.format(plugin_id), 'family_name': 'General',
+                         'attributes': [{'attribute_name': 'risk_factor', 'attribute_value': 'Medium'}]})
+
+    # -- v3 endpoints -------------------------------------------------------
+
+    def _v3_records(self, source):
+        data = self.state.data
+        if source.startswith('findings'):
+            return data.findings
+        return [dict(a, name=a['netbios_name'][0], ipv4_addresses=a['ipv4'], display_ipv4_address=a['ipv4'][0],
+                     last_observed=a['last_seen'], types=['host']) for a in data.assets.values()]
+
+    def _search(self, source):
+        body = self._body()
+        records = self._v3_records(source)
+        if body.get('filter'):
+            records = [r for r in records if _matches_v3(r, body['filter'])]
+
+        offset = int(body.get('next') or 0)
+        limit = min(int(body.get('limit', 200)), self.state.page_size)
+        page = records[offset:offset + limit]
+        next_token = str(offset + limit) if offset + limit < len(records) else None
+        self._send(200, {'data': [_project(r, body.get('fields')) for r in page],
+                         'pagination': {'total': len(records), 'next': next_token}})
+
+    def search_assets(self, query):
+        self._search('assets')
+
+    def search_findings(self, query):
+        self._search('findings')
+
+    def create_export(self, query):
+        body = self._body()
+        definition = body.get('definition', {})
+
+        # Snapshot the matching records now, like the real export does.
+        records = self._v3_records(body.get('source') or '')
+        if definition.get('filter'):
+            records = [r for r in records if _matches_v3(r, definition['filter'])]
+
+        size = self.state.export_chunk_size
+        job = {'id': str(uuid.uuid4()), 'name': body.get('name'), 'source': body.get('source'),
+               'format': body.get('format', 'json'), 'definition': definition,
+               'created': time.time(), 'expiration': body.get('expiration'),
+               'chunks': [records[x:x + size] for x in range(0, len(records), size)] or [[]]}
+        with self.state.lock:
+            self.state.exports[job['id']] = job
+        self._send(200, {'id': job['id']})
+
+    def _chunks_available(self, job):
+        # Chunks finish one after another, spread evenly over export_delay.
+        if self.state.export_delay <= 0:
+            return len(job['chunks'])
+        elapsed = time.time() - job['created']
+        return min(len(job['chunks']), int(elapsed / self.state.export_delay * len(job['chunks'])))
+
+    def _job_status(self, job):
+        return 'FINISHED' if self._chunks_available(job) >= len(job['chunks']) else 'PROCESSING'
+
+    def export_status(self, query, job_id):
+        job = self.state.exports.get(job_id)
+        if job is None:
+            return self._send(404, {'error': 'Export not found'})
+        self._send(200, {'id': job_id, 'name': job['name'], 'source': job['source'], 'status': self._job_status(job),
+                         'chunks_available': list(range(self._chunks_available(job)))})
+
+    def export_content(self, query, job_id):
+        job = self.state.exports.get(job_id)
+        if job is None:
+            return self._send(404, {'error': 'Export not found'})
+        if self._job_status(job) != 'FINISHED':
+            return self._send(409, {'error': 'Export is not finished'})
+
+        self._send_download(self._export_bytes(job, 'content'))
+
+    def export_chunk(self, query, job_id, chunk_id):
+        job = self.state.exports.get(job_id)
+        if job is None or int(chunk_id) >= len(job['chunks']):
+            return self._send(404, {'error': 'Export chunk not found'})
+        if int(chunk_id) >= self._chunks_available(job):
+            return self._send(409, {'error': 'Export chunk is not ready'})
+
+        self._send_download(self._export_bytes(job, int(chunk_id)))
+
+    def _export_bytes(self, job, chunk_id):
+        # Serialized once per job/chunk, so every Range request sees the same bytes.
+        with self.state.lock:
+            cache = job.setdefault('bytes', {})
+            if chunk_id not in cache:
+                fields = job['definition'].get('fields')
+                records = [r for chunk in job['chunks'] for r in chunk] if chunk_id == 'content' else job['chunks'][chunk_id]
+                cache[chunk_id] = json.dumps([_project(r, fields) for r in records]).encode()
+            return cache[chunk_id]
+
+def _add_routes():
+    h = mock_handler
+    return [
+        ('GET', r'/workbenches/assets', h.workbench_assets),
+        ('GET', r'/workbenches/assets/vulnerabilities', h.workbench_vulns),
+        ('DELETE', r'/workbenches/assets/([0-9a-f-]+)', h.delete_workbench_asset),
+        ('POST', r'/api/v2/assets/bulk-jobs/delete', h.bulk_delete_assets),
+        ('GET', r'/target-groups', h.list_target_groups),
+        ('POST', r'/target-groups', h.create_target_group),
+        ('PUT', r'/target-groups/(\d+)', h.create_target_group),
+        ('GET', r'/scanners', h.list_scanners),
+        ('GET', r'/scanners/(\d+)/agent-groups', h.list_agent_groups),
+        ('GET', r'/scanners/(\d+)/agents', h.list_agents),
+        ('GET', r'/filters/scans/agents', h.agent_filters),
+        ('GET', r'/folders', h.list_folders),
+        ('GET', r'/scans', h.list_scans),
+        ('POST', r'/scans', h.create_scan),
+        ('GET', r'/editor/scan/templates', h.list_templates),
+        ('GET', r'/tags/values', h.list_tag_values),
+        ('GET', r'/plugins/plugin/(\d+)', h.plugin_details),
+        ('POST', r'/api/v3/assets/search', h.search_assets),
+        ('POST', r'/api/v3/assets/host/search', h.search_assets),
+        ('POST', r'/api/v3/findings/vulnerabilities/host/search', h.search_findings),
+        ('POST', r'/api/v3/exports/jobs', h.create_export),
+        ('GET', r'/api/v3/exports/jobs/([0-9a-f-]+)', h.export_status),
+        ('GET', r'/api/v3/exports/jobs/([0-9a-f-]+)/content', h.export_content),
+        ('GET', r'/api/v3/exports/jobs/([0-9a-f-]+)/chunks/(\d+)', h.export_chunk),
+    ]
+
+ROUTES = _add_routes()
+
+def make_server(host='127.0.0.1', port=8080, seed=1, assets=DEFAULT_ASSETS, findings_per_asset=DEFAULT_FINDINGS_PER_ASSET,
+                latency=0.0, jitter=0.0, page_size=DEFAULT_PAGE_SIZE, throttle_rate=0.0, retry_after=1,
+                export_delay=DEFAULT_EXPORT_DELAY, export_chunk_size=DEFAULT_EXPORT_CHUNK_SIZE, drop_rate=0.0):
+    dataset = synthetic_dataset(seed, assets, findings_per_asset)
+    state = mock_state(dataset, latency, jitter, page_size, throttle_rate, retry_after, export_delay, seed,
+                       export_chunk_size, drop_rate)
+    handler = type('bound_mock_handler', (mock_handler,), {'state': state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.state = state
+    return server
+
+def start_server(host='127.0.0.1', port=0, **kwargs):
+    # Runs the mock on a daemon thread. Returns (server, base_url).
+    server = make_server(host, port, **kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, 'http://{}:{}'.format(host, server.server_address[1])
+
+def main():
+    parser = argparse.ArgumentParser(description='Local mock of the Tenable.io API for offline testing.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--seed', type=int, default=1, help='Seed for the synthetic dataset.')
+    parser.add_argument('--assets', type=int, default=DEFAULT_ASSETS, help='Number of synthetic assets.')
+    parser.add_argument('--findings-per-asset', type=int, default=DEFAULT_FINDINGS_PER_ASSET)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every response.')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Up to this many extra random seconds per response.')
+    parser.add_argument('--page-size', type=int, default=DEFAULT_PAGE_SIZE, help='Largest page returned by list endpoints.')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Fraction of requests answered with HTTP 429.')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After seconds sent with injected 429s.')
+    parser.add_argument('--export-delay', type=float, default=DEFAULT_EXPORT_DELAY, help='Seconds until export jobs finish.')
+    parser.add_argument('--export-chunk-size', type=int, default=DEFAULT_EXPORT_CHUNK_SIZE, help='Records per export chunk.')
+    parser.add_argument('--drop-rate', type=float, default=0.0, help='Fraction of export downloads cut off halfway.')
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.seed, args.assets, args.findings_per_asset, args.latency,
+                         args.jitter, args.page_size, args.throttle_rate, args.retry_after, args.export_delay,
+                         args.export_chunk_size, args.drop_rate)
+    print('Mock Tenable.io listening on http://{}:{} ({} assets, {} findings)'.format(
+        args.host, server.server_address[1], len(server.state.data.assets), len(server.state.data.findings)))
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -12,10 +12,20 @@ Usage:
     $ python3 pytenable-tio-agent-search-vulns.py <AgentName>
     $ python3 pytenable-tio-agent-search-vulns.py Garys-Laptop
 
+If the local store (tio_store.sqlite, or TIO_STORE_PATH) has been filled by "tio-v3-api-export-vulns.py --incremental",
+the agent and its findings are read from it with no API calls, and the age of that data is shown. Once the data is
+older than 2 hours, the script falls back to the live API. Force one or the other with:
+    $ python3 pytenable-tio-agent-search-vulns.py Garys-Laptop --offline     # Use the local store however old it is
+    $ python3 pytenable-tio-agent-search-vulns.py Garys-Laptop --live        # Skip the local store
+
 # ------------------------------------------------------------------------------------------------------------------ """
 
+import os
+import sys
 from tenable.io import TenableIO
-tio = TenableIO('REPLACE_THIS_WITH_YOUR_ACCESS_KEY', 'REPLACE_THIS_WITH_YOUR_SECRET_KEY')
+from tio_client import SEARCH_MAX_PAGE_SIZE, search_pages
+tio = TenableIO('REPLACE_THIS_WITH_YOUR_ACCESS_KEY', 'REPLACE_THIS_WITH_YOUR_SECRET_KEY',
+               url=os.environ.get('TIO_BASE_URL', 'https://cloud.tenable.com')) # Override to use mock_tio_server.py
 
 # Uncomment the 2 logging lines below to see ERROR or DEBUG logs in stdout while running the script.
 # 
@@ -52,7 +62,7 @@ def user_input_agent_name():
     agent_name = ""
 
     try:
-        agent_name = sys.argv[1] # Try to use the arg passed in with the script.
+        agent_name = [arg for arg in sys.argv[1:] if not arg.startswith('--')][0] # Try to use the arg passed in with the script.
     except:
         agent_name = input("Please provide your Agent name: ") # Allow user input if no args were passed in.
 
@@ -71,7 +81,7 @@ Notes: There could be more than one asset matched with the filter for the tenabl
 
 def get_uuid_from_tenableid(tenable_id, agent_name):
 
-    agents = tio.v3.explore.assets.search_host(
+    agents = search_pages(tio.v3.explore.assets.search_host, 'assets', first_limit=SEARCH_MAX_PAGE_SIZE, # One request, however many match.
         filter={
               "and": [
                 {
@@ -88,19 +98,20 @@ def get_uuid_from_tenableid(tenable_id, agent_name):
                 }
               ]
             },
-        limit=2, sort=[('last_observed', 'asc')])
+        sort=[('last_observed', 'asc')])
 
     return agents
 
 """ --------------------------------------------------------------------------------------------------------------------
 Function: get_findings
 Input: We pass in the 36-char Tenable.io asset UUID.
-Output: An iterable "findings" that contain all vulnerability results for the matching asset UUID.
+Output: An iterable "findings" that contain all vulnerability results for the matching asset UUID, fetched page by page
+        (see search_pages) as it's iterated.
 Notes: This includes all possible findings/vuln data fields. Can be shortened if you only need a handful of fields.
 # ------------------------------------------------------------------------------------------------------------------ """
 
 def get_findings(agent_tio_uuid):
-    findings = tio.v3.explore.findings.search_host(
+    findings = search_pages(tio.v3.explore.findings.search_host, 'findings',
         filter={
               "and": [
                 {
@@ -131,7 +142,6 @@ def get_findings(agent_tio_uuid):
                 }
               ]
             },
-           limit=2, 
            fields=[            
                     "id",
                     "state",
@@ -222,6 +232,81 @@ def report_findings(findings):
 
         ##### if x == 2: break # Uncomment this line for quicker debugging. Only prints the first finding.
 
+""" --------------------------------------------------------------------------------------------------------------------
+Function: search_local_store
+Input: The agent name as a str(), and whether to use the local store even when its data is stale.
+Output: True if the agent's findings were reported from the local store, False if the live API is needed instead.
+Notes: The store only holds what "tio-v3-api-export-vulns.py --incremental" exports (open severity 4 findings by
+        default), and the agents in "tio-v3-api-export-assets.py --incremental". An agent it doesn't know, or one
+        with no stored findings, is looked up live unless --offline is given. The data is as old as the older of
+        the two exports. Like the live search, any agent whose name contains agent_name matches; the live search
+        goes on with one of them, while this reports the findings of every match.
+# ------------------------------------------------------------------------------------------------------------------ """
+
+LIVE_SEVERITIES = [1, 2, 3, 4] # What the live search below asks for.
+
+def stored_severities(store):
+    # The severities the stored findings exports were filtered down to, or
+    # None when they aren't filtered on severity (or we can't tell).
+    severities = set()
+
+    for filter in store.filters('findings'):
+        if filter == 'unknown':
+            return set() # Stored before filters were kept, so assume the least.
+        conditions = [c for c in (filter or {}).get('and', []) if c.get('property') == 'severity']
+        if not conditions or conditions[0].get('operator') != 'eq':
+            return None
+        severities.update(conditions[0].get('value') or [])
+
+    return severities
+
+def search_local_store(agent_name, allow_stale=False):
+    from tio_store import STALE_AFTER, STORE_PATH, export_store, get_record_id
+
+    if not os.path.exists(STORE_PATH):
+        return False
+
+    store = export_store(STORE_PATH, readonly=True)
+    if not store.indexed:
+        return False # Not indexed yet; the next incremental export takes care of that.
+
+    age = store.age('findings')
+
+    if age is None:
+        return False
+
+    age = max(age, store.age('assets') or 0) # Only as fresh as the older of the two exports.
+
+    if age > STALE_AFTER and not allow_stale:
+        print("Local data is {} minutes old, asking the live API instead.".format(int(age // 60)))
+        return False
+
+    assets = store.lookup('agent_name', agent_name, 'assets', match=True)
+    if assets:
+        findings = [f for asset in assets for f in store.lookup('asset_id', get_record_id(asset), 'findings')]
+    else:
+        findings = store.lookup('agent_name', agent_name, 'findings', match=True)
+
+    if not assets and not findings:
+        return False
+
+    if not findings and not allow_stale:
+        print("No findings stored locally for {}, asking the live API instead.".format(agent_name))
+        return False
+
+    print("Using local data from {} minutes ago ({}).".format(int(age // 60), STORE_PATH))
+
+    if len(assets) > 1:
+        print("{} agents match '{}'; showing the findings of all of them.".format(len(assets), agent_name))
+
+    severities = stored_severities(store)
+    if severities is not None and not set(LIVE_SEVERITIES) <= severities:
+        print("Only severity {} findings are stored locally; run with --live for severities {}-{}.".format(
+            ', '.join(str(x) for x in sorted(severities)) or 'unknown', LIVE_SEVERITIES[0], LIVE_SEVERITIES[-1]))
+
+    report_findings(sorted(findings, key=lambda finding: -(finding.get('severity') or 0)))
+    return True
+
 """ --------------------------------------------------------------------------------------------------------------------
 Function: search_for_agent_info
 Input: None, this is our entry point.
@@ -237,6 +322,9 @@ def search_for_agent_info():
     
     if len(agent_name) >= 3: # Adding some basic length check to ensure the name is valid before proceeding.
 
+        if '--live' not in sys.argv and search_local_store(agent_name, '--offline' in sys.argv):
+            return # Answered from the local store, no API calls needed.
+
         agent_info = find_agent(agent_name)
 
         tenable_id = agent_info['uuid'] # The find_agent() func only returns a portion of the data we need about the agent. 
@@ -12,10 +12,20 @@ Usage:
     $ python3 pytenable-tio-agent-search.py <AgentName>
     $ python3 pytenable-tio-agent-search.py Garys-Laptop
 
+If the local store (tio_store.sqlite, or TIO_STORE_PATH) has been filled by "tio-v3-api-export-assets.py --incremental",
+the agent and its asset details are read from it with no API calls, and the age of that data is shown. Once the data is
+older than 2 hours, the script falls back to the live API. Force one or the other with:
+    $ python3 pytenable-tio-agent-search.py Garys-Laptop --offline     # Use the local store however old it is
+    $ python3 pytenable-tio-agent-search.py Garys-Laptop --live        # Skip the local store
+
 # ------------------------------------------------------------------------------------------------------------------ """
 
+import os
+import sys
 from tenable.io import TenableIO
-tio = TenableIO('REPLACE_THIS_WITH_YOUR_ACCESS_KEY', 'REPLACE_THIS_WITH_YOUR_SECRET_KEY')
+from tio_client import SEARCH_MAX_PAGE_SIZE, search_pages
+tio = TenableIO('REPLACE_THIS_WITH_YOUR_ACCESS_KEY', 'REPLACE_THIS_WITH_YOUR_SECRET_KEY',
+               url=os.environ.get('TIO_BASE_URL', 'https://cloud.tenable.com')) # Override to use mock_tio_server.py
 
 # Uncomment the 2 logging lines below to see ERROR or DEBUG logs in stdout while running the script.
 # 
@@ -52,7 +62,7 @@ def user_input_agent_name():
     agent_name = ""
 
     try:
-        agent_name = sys.argv[1] # Try to use the arg passed in with the script.
+        agent_name = [arg for arg in sys.argv[1:] if not arg.startswith('--')][0] # Try to use the arg passed in with the script.
     except:
         agent_name = input("Please provide your Agent name: ") # Allow user input if no args were passed in.
 
@@ -71,7 +81,7 @@ Notes: There could be more than one asset matched with the filter for the tenabl
 
 def get_uuid_from_tenableid(tenable_id, agent_name):
 
-    agents = tio.v3.explore.assets.search_host(
+    agents = search_pages(tio.v3.explore.assets.search_host, 'assets', first_limit=SEARCH_MAX_PAGE_SIZE, # One request, however many match.
         filter={
               "and": [
                 {
@@ -88,10 +98,51 @@ def get_uuid_from_tenableid(tenable_id, agent_name):
                 }
               ]
             },
-        limit=2, sort=[('last_observed', 'asc')])
+        sort=[('last_observed', 'asc')])
 
     return agents
 
+""" --------------------------------------------------------------------------------------------------------------------
+Function: search_local_store
+Input: The agent name as a str(), and whether to use the local store even when its data is stale.
+Output: True if the agent's asset details were printed from the local store, False if the live API is needed instead.
+Notes: The store only holds the fields "tio-v3-api-export-assets.py --incremental" exports. An agent it doesn't know
+        is looked up live. Like the live search, any agent whose name contains agent_name matches; the live search
+        goes on with one of them, while this prints every match.
+# ------------------------------------------------------------------------------------------------------------------ """
+
+def search_local_store(agent_name, allow_stale=False):
+    from pprint import pprint
+    from tio_store import STALE_AFTER, STORE_PATH, export_store
+
+    if not os.path.exists(STORE_PATH):
+        return False
+
+    store = export_store(STORE_PATH, readonly=True)
+    if not store.indexed:
+        return False # Not indexed yet; the next incremental export takes care of that.
+
+    age = store.age('assets')
+
+    if age is None:
+        return False
+
+    if age > STALE_AFTER and not allow_stale:
+        print("Local data is {} minutes old, asking the live API instead.".format(int(age // 60)))
+        return False
+
+    assets = store.lookup('agent_name', agent_name, 'assets', match=True)
+    if not assets:
+        return False
+
+    print("Using local data from {} minutes ago ({}).".format(int(age // 60), STORE_PATH))
+    if len(assets) > 1:
+        print("{} agents match '{}'.".format(len(assets), agent_name))
+    for agent in assets:
+        print("Agent tenable_id: ", agent.get('tenable_id'))
+        pprint(agent)
+    return True
+
 """ --------------------------------------------------------------------------------------------------------------------
 Function: search_for_agent_info
 Input: None, this is our entry point. 
@@ -107,6 +158,9 @@ def search_for_agent_info():
     
     if len(agent_name) >= 3: # Adding some basic length check to ensure the name is valid before proceeding.
 
+        if '--live' not in sys.argv and search_local_store(agent_name, '--offline' in sys.argv):
+            return # Answered from the local store, no API calls needed.
+
         agent_info = find_agent(agent_name)
 
         tenable_id = agent_info['uuid'] # The find_agent() func only returns a portion of the data we need about the agent. 
@@ -1,7 +1,10 @@
 
 import requests
+import os
 
-url = "https://cloud.tenable.com/plugins/plugin/500001"
+BASE_URL = os.environ.get('TIO_BASE_URL', 'https://cloud.tenable.com') # Override to use mock_tio_server.py
+
+url = BASE_URL + "/plugins/plugin/500001"
 
 headers = {
     "Accept": "application/json",
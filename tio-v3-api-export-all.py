@@ -0,0 +1,68 @@
+""" --------------------------------------------------------------------------------------------------------------------
+Python Tenable.io - Run the asset and vulnerability exports together, unattended:
+
+Submits the export jobs defined in "tio-v3-api-export-assets.py" and "tio-v3-api-export-vulns.py" at the same time,
+and downloads each job's chunks in parallel as soon as they're ready, while the job is still producing the rest.
+Each export is saved as a directory of chunk files (<name>-<export_uuid>/0.json, 1.json, ...). Meant for a nightly cron job.
+If the same data was already exported in the last 15 minutes, that finished job is downloaded instead of a new one.
+
+To run this script:
+   $ python3 tio-v3-api-export-all.py
+
+You can also choose where the files are written:
+   $ python3 tio-v3-api-export-all.py /data/tio-exports
+
+Add --parquet to also convert each export, as it downloads, into a compressed Parquet dataset
+(<name>-<export_uuid>.parquet/) with one column per requested field, so reports can read just the columns they need.
+Needs pyarrow (pip install pyarrow).
+   $ python3 tio-v3-api-export-all.py /data/tio-exports --parquet
+
+# ------------------------------------------------------------------------------------------------------------------ """
+
+import importlib.util
+import os
+import sys
+
+from tio_exports import export_filename, run_exports
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+EXPORT_SCRIPTS = ['tio-v3-api-export-assets.py', 'tio-v3-api-export-vulns.py']
+
+def load_payload(filename):
+    # The export scripts have hyphens in their names, so import them by path.
+    spec = importlib.util.spec_from_file_location(filename[:-3].replace('-', '_'), os.path.join(SCRIPT_DIR, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.payload
+
+args = [arg for arg in sys.argv[1:] if arg != '--parquet']
+parquet = '--parquet' in sys.argv[1:]
+
+try:
+    output_dir = args[0]
+except:
+    output_dir = '.'
+
+def parquet_sink_for(payload, export_uuid):
+    from tio_columnar import parquet_sink
+
+    path = os.path.join(output_dir, os.path.splitext(export_filename(payload, export_uuid))[0] + '.parquet')
+    return parquet_sink.for_payload(payload, path)
+
+def chunk_saved(export_uuid, chunk_id, path):
+    print("Export {}: chunk {} saved to {}".format(export_uuid, chunk_id, path))
+
+results = run_exports([load_payload(filename) for filename in EXPORT_SCRIPTS], output_dir=output_dir, on_chunk=chunk_saved,
+                      sink_factory=parquet_sink_for if parquet else None)
+
+for x in range(len(results)):
+    if results[x].error:
+        print("{}: export {} failed: {}".format(EXPORT_SCRIPTS[x], results[x].id, results[x].error))
+    else:
+        print("{}: export {} saved to {} ({} chunks{})".format(EXPORT_SCRIPTS[x], results[x].id, results[x].path,
+                                                             len(results[x].chunks), ", reused" if results[x].reused else ""))
+        if results[x].sink:
+            print("{}: {} rows written to {}".format(EXPORT_SCRIPTS[x], results[x].sink.rows, results[x].sink.path))
+
+if any(result.error for result in results):
+    sys.exit(1)
@@ -7,20 +7,21 @@ UUID necessary for this script. You can pass the UUID in to this script as an ar
 To run this script:
    $ python3 tio-v3-api-export-download.py
 
-You can also directly pass in the UUID:
+You can also directly pass in the UUID, and optionally where to save the content (default ./<export_uuid>.json):
    $ python3 tio-v3-api-export-download.py <export_uuid_here>
    $ python3 tio-v3-api-export-download.py 4db49aa5-90c4-4820-a511-750d66715d42
+   $ python3 tio-v3-api-export-download.py 4db49aa5-90c4-4820-a511-750d66715d42 /data/vulns.json
+
+The content is streamed straight to disk, so exports of any size download in constant memory.
+It's written to <output>.part first, and only renamed to <output> once its size and checksum have been verified.
+If the connection drops, the download is retried from where it stopped; if the script itself is interrupted, run
+it again with the same arguments and it picks up from the .part file instead of starting over.
 
 # ------------------------------------------------------------------------------------------------------------------ """
 
-import requests
-import os
 import sys
 
-headers = {
-    "Accept": "application/octet-stream",
-    "X-ApiKeys": "accessKey=REPLACE_THIS_WITH_YOUR_ACCESS_KEY;secretKey=REPLACE_THIS_WITH_YOUR_SECRET_KEY"
-}
+from tio_exports import download_export, export_error, wait_for_export # API keys and TIO_BASE_URL are handled by tio_client.py
 
 try:
     export_uuid = sys.argv[1]
@@ -31,10 +32,24 @@ if len(export_uuid) != 36:
     print("This is an invalid export UUID!")
     sys.exit()
 
-# Example url = "https://cloud.tenable.com/api/v3/exports/jobs/104a3108-f952-4a6b-b7b9-ff268e67d56f/content"
+# Don't download until the job has actually finished.
+try:
+    wait_for_export(export_uuid)
+except export_error as e:
+    print(e)
+    sys.exit()
+
+try:
+    output_path = sys.argv[2]
+except:
+    output_path = export_uuid + ".json"
 
-formatted_url = "https://cloud.tenable.com/api/v3/exports/jobs/" + export_uuid + "/content"
+# Example url = "https://cloud.tenable.com/api/v3/exports/jobs/104a3108-f952-4a6b-b7b9-ff268e67d56f/content"
 
-response = requests.get(formatted_url, headers=headers)
+try:
+    download_export(export_uuid, output_path)
+except export_error as e:
+    print(e)
+    sys.exit()
 
-print(response.text)
+print("Export {} saved to {}".format(export_uuid, output_path))
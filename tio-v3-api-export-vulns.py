@@ -7,19 +7,19 @@ You can generate the key under User Settings -> API Keys ->  'Generate' if neces
 To run this script:
    $ python3 tio-v3-api-export-vulns.py
 
-Then use "tio-v3-api-export-download.py" with the resulting UUID to fetch the results.
+The job is polled until it finishes, and its content is saved to ./<name>-<export_uuid>.json. If the same export
+finished in the last 15 minutes, that job's content is used instead of requesting a new one.
+To run this export alongside the others, use "tio-v3-api-export-all.py".
 
-# ------------------------------------------------------------------------------------------------------------------ """
+For scheduled refreshes, --incremental keeps a local copy in tio_store.sqlite (TIO_STORE_PATH to move it) instead.
+The first run exports everything; later runs only export the findings observed since the previous run and merge them in.
+   $ python3 tio-v3-api-export-vulns.py --incremental
 
-import requests
+# ------------------------------------------------------------------------------------------------------------------ """
 
-url = "https://cloud.tenable.com/api/v3/exports/jobs"
+import sys
 
-headers = {
-    "Accept": "application/json",
-    "Content-Type": "application/json",
-    "X-ApiKeys": "accessKey=REPLACE_THIS_WITH_YOUR_ACCESS_KEY;secretKey=REPLACE_THIS_WITH_YOUR_SECRET_KEY"
-}
+from tio_exports import run_exports # API keys and TIO_BASE_URL are handled by tio_client.py
 
 
 payload = {
@@ -81,6 +81,9 @@ payload = {
          "asset.display_ipv4_address",
          "asset.display_ipv6_address",
          "asset.id",
+         "asset.tenable_id",
+         "asset.agent_name",
+         "asset.host_ips",
          "last_seen",
          "definition.type",
          "definition.severity",
@@ -111,6 +114,21 @@ payload = {
    "expiration":2
 }
 
-response = requests.post(url, json=payload, headers=headers)
+if __name__ == '__main__' and '--incremental' in sys.argv[1:]:
+    from tio_exports import export_error
+    from tio_store import run_incremental
+
+    try:
+        result = run_incremental(payload)
+    except export_error as e:
+        print("Incremental export failed, nothing was merged: {}".format(e))
+        sys.exit(1)
 
-print(response.text)
\ No newline at end of file
+    print("{} export {}: {} records merged, now up to date as of {}".format(
+        "Full" if result.full else "Incremental", result.id, result.rows, result.watermark))
+elif __name__ == '__main__':
+    for result in run_exports([payload]):
+        if result.error:
+            print("Export {} failed: {}".format(result.id, result.error))
+        else:
+            print("Export {} saved to {}{}".format(result.id, result.path, " (reused)" if result.reused else ""))
\ No newline at end of file
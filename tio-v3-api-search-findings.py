@@ -1,6 +1,9 @@
 import requests
+import os
 
-url = "https://cloud.tenable.com/api/v3/findings/vulnerabilities/host/search"
+BASE_URL = os.environ.get('TIO_BASE_URL', 'https://cloud.tenable.com') # Override to use mock_tio_server.py
+
+url = BASE_URL + "/api/v3/findings/vulnerabilities/host/search"
 
 payload = {
     "fields": ["asset.name", "definition.name", "state", "source", "port", "output"],
@@ -1,6 +1,10 @@
 import requests
+import os
+import sys
 
-url = "https://cloud.tenable.com/api/v3/assets/host/search"
+BASE_URL = os.environ.get('TIO_BASE_URL', 'https://cloud.tenable.com') # Override to use mock_tio_server.py
+
+url = BASE_URL + "/api/v3/assets/host/search"
 
 headers = {
     "Accept": "application/json",
@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+#
+# Notes:
+# asyncio flavour of tio_client.py for the high fan-out loops in this repo
+# (one workbench query per tag, one agent list per agent group, one DELETE per
+# asset UUID). Instead of waiting on one round trip at a time, requests are
+# issued concurrently over a single aiohttp session, with a semaphore capping
+# how many are in flight at once. The shared scheduler in tio_scheduler.py
+# further paces requests and backs off when Tenable.io starts throttling.
+#
+# Author: ThisTooShallXSS (https://github.com/thistooshallxss)
+# Requirements: Python 3.7+, aiohttp, requests (for tio_client.py)
+#
+# Usage:
+# - from tio_async import get_all_data, delete_all_assets
+# - results = get_all_data(['/scanners', '/folders'])    # Same order as the input
+# - failed = delete_all_assets(uuids, concurrency=200)     # Returns UUIDs that failed
+# - delete_all_assets(uuids, on_deleted=journal.record)     # Called per deleted UUID
+#
+# Or, from inside a coroutine:
+# - async with async_api_client(concurrency=100) as tio:
+#       data = await tio.get_data('/target-groups')
+
+import asyncio
+import json
+
+import aiohttp
+
+from tio_client import BASE_URL, CONNECT_TIMEOUT, READ_TIMEOUT, grab_headers
+from tio_scheduler import get_scheduler
+
+CONCURRENCY = 50 # Default number of requests allowed in flight at once.
+
+class api_error(Exception): # Raised for any unexpected HTTP status code.
+    def __init__(self, status, message):
+        Exception.__init__(self, 'Status: {} {}'.format(status, message))
+        self.status = status
+
+class async_api_client(object): # One aiohttp session plus a semaphore bounding concurrency.
+    def __init__(self, headers=None, base_url=BASE_URL, concurrency=CONCURRENCY,
+                 connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT, scheduler=None):
+        self.headers = headers if headers else grab_headers()
+        self.base_url = base_url
+        self.concurrency = concurrency
+        self.scheduler = scheduler if scheduler else get_scheduler()
+        self.timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        self.session = None
+        self.semaphore = None
+
+    async def __aenter__(self):
+        # The connector limit matches the semaphore so every in-flight request
+        # gets its own keep-alive connection. ssl=False mirrors verify=False.
+        connector = aiohttp.TCPConnector(limit=self.concurrency, ssl=False)
+        self.session = aiohttp.ClientSession(headers=self.headers, connector=connector, timeout=self.timeout)
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.session.close()
+
+    async def request(self, req_type, url_mod, **kwargs):
+        # Returns (status, parsed JSON body or None). Throttled, unavailable
+        # and dropped requests are retried per the shared scheduler (POSTs
+        # only when that can't run them twice).
+        attempt = 0
+
+        async with self.semaphore:
+            while True:
+                await self.scheduler.acquire_async()
+
+                try:
+                    async with self.session.request(req_type, self.base_url + url_mod, **kwargs) as r:
+                        status = r.status
+                        retry_after = r.headers.get('Retry-After')
+                        body = await r.read()
+                except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                    self.scheduler.release(None)
+                    delay = self.scheduler.retry_delay(attempt, method=req_type,
+                                                       connect_failed=isinstance(e, aiohttp.ClientConnectorError))
+                    if delay is None:
+                        raise
+                else:
+                    self.scheduler.release(status)
+                    delay = self.scheduler.retry_delay(attempt, status, retry_after, req_type)
+                    if delay is None:
+                        data = json.loads(body) if body else None
+                        return status, data
+
+                attempt += 1
+                await asyncio.sleep(delay)
+
+    async def get_data(self, url_mod):
+        status, data = await self.request('GET', url_mod)
+
+        if status != 200:
+            raise api_error(status, 'Problem with the GET request to {}.'.format(url_mod))
+
+        return data
+
+    async def create_target_group(self, req_type, ip_addrs, name, tg_id=0):
+        json_payload = '{{"name":"{}","members":"{}","type":"system","acls":[{{"permissions":64,"type":"default"}}]}}'.format(name, ip_addrs)
+        url_mod = '/target-groups'
+
+        if tg_id > 0:
+            url_mod = url_mod + '/{}'.format(tg_id)
+
+        status, data = await self.request(req_type, url_mod, data=json_payload)
+
+        if status != 200:
+            raise api_error(status, 'Problem with the {} request to create target group.'.format(req_type))
+
+        return data["id"]
+
+    async def delete_asset(self, uuid):
+        status, data = await self.request('DELETE', '/workbenches/assets/{}'.format(uuid))
+
+        if status != 202:
+            raise api_error(status, 'Problem with the DELETE asset request.')
+
+    async def search(self, url_mod, payload):
+        # POST to one of the v3 search endpoints, e.g. /api/v3/assets/host/search
+        status, data = await self.request('POST', url_mod, json=payload)
+
+        if status != 200:
+            raise api_error(status, 'Problem with the search request to {}.'.format(url_mod))
+
+        return data
+
+async def _get_all_data(url_mods, concurrency):
+    async with async_api_client(concurrency=concurrency) as tio:
+        return await asyncio.gather(*[tio.get_data(url_mod) for url_mod in url_mods])
+
+async def _delete_all_assets(uuids, concurrency, on_deleted):
+    async def delete(tio, uuid):
+        await tio.delete_asset(uuid)
+        if on_deleted:
+            on_deleted(uuid)
+
+    async with async_api_client(concurrency=concurrency) as tio:
+        results = await asyncio.gather(*[delete(tio, uuid) for uuid in uuids], return_exceptions=True)
+
+    return [uuids[x] for x in range(len(uuids)) if isinstance(results[x], Exception)]
+
+def get_all_data(url_mods, concurrency=CONCURRENCY):
+    # GET every url_mod concurrently. Results come back in the same order.
+    return asyncio.run(_get_all_data(url_mods, concurrency))
+
+def delete_all_assets(uuids, concurrency=CONCURRENCY, on_deleted=None):
+    # DELETE every asset concurrently. on_deleted(uuid) is called as each one
+    # succeeds. Returns the UUIDs that could not be deleted.
+    return asyncio.run(_delete_all_assets(list(uuids), concurrency, on_deleted))
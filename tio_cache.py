@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+#
+# Notes:
+# Small on-disk cache for Tenable.io metadata that rarely changes: scanners,
+# folders, scan templates and target groups. Scripts used to re-download the
+# full list every time they needed to look up one name. With this cache, the
+# first lookup stores the response on disk and every later lookup, in this run
+# or the next one, is served from memory or disk until its TTL runs out.
+#
+# Entries are kept per container (base URL + access key), so switching keys or
+# pointing TIO_BASE_URL at mock_tio_server.py never serves someone else's data.
+#
+# Author: ThisTooShallXSS (https://github.com/thistooshallxss)
+# Requirements: Python 3, requests (for tio_client.py)
+#
+# Usage:
+# - from tio_cache import cached_get_data, invalidate
+# - scanners = cached_get_data('/scanners')["scanners"]
+# - invalidate('/target-groups')   # After changing target groups yourself
+# - invalidate()                   # Drop everything
+#
+# TIO_CACHE_DIR overrides where the files are kept (default ~/.cache/tio_automation).
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+CACHE_DIR = os.environ.get('TIO_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'tio_automation'))
+DEFAULT_TTL = 300 # Seconds, for anything without its own entry in TTLS.
+TTLS = {
+    '/scanners': 3600,
+    '/folders': 3600,
+    '/editor/scan/templates': 86400,
+    '/target-groups': 300,
+}
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def _default_scope():
+    from tio_client import BASE_URL, grab_headers
+
+    return BASE_URL + '|' + grab_headers()['X-ApiKeys'].split(';')[0]
+
+class metadata_cache(object): # Memory in front of disk, both keyed by endpoint, with per-endpoint TTLs.
+    def __init__(self, cache_dir=CACHE_DIR, scope=None, ttls=None, default_ttl=DEFAULT_TTL):
+        self.base_dir = cache_dir
+        self.scope = scope
+        self.ttls = dict(TTLS, **(ttls or {}))
+        self.default_ttl = default_ttl
+        self._memory = {} # key -> (fetched, data)
+        self._lock = threading.Lock()
+        self._dir = None
+
+    def _cache_dir(self):
+        # One sub-directory per container, named by a hash so no key material hits the disk.
+        if self._dir is None:
+            scope = self.scope if self.scope is not None else _default_scope()
+            self._dir = os.path.join(self.base_dir, hashlib.sha256(scope.encode()).hexdigest()[:16])
+            os.makedirs(self._dir, exist_ok=True)
+        return self._dir
+
+    def _path(self, key):
+        return os.path.join(self._cache_dir(), hashlib.sha256(key.encode()).hexdigest()[:24] + '.json')
+
+    def _read_disk(self, key):
+        try:
+            with open(self._path(key)) as f:
+                entry = json.load(f)
+            return entry['fetched'], entry['data']
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _write_disk(self, key, fetched, data):
+        # Write to a temp file and rename it into place, so a second script
+        # reading at the same moment never sees a half-written file.
+        path = self._path(key)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'key': key, 'fetched': fetched, 'data': data}, f)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def ttl(self, key):
+        return self.ttls.get(key, self.default_ttl)
+
+    def peek(self, key, ttl=None):
+        # The cached data for `key` if it's younger than its TTL, else None.
+        ttl = self.ttl(key) if ttl is None else ttl
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                entry = self._read_disk(key)
+                if entry is not None:
+                    self._memory[key] = entry
+
+            if entry is not None and now - entry[0] < ttl:
+                return entry[1]
+
+        return None
+
+    def put(self, key, data):
+        fetched = time.time()
+
+        with self._lock:
+            self._memory[key] = (fetched, data)
+            self._write_disk(key, fetched, data)
+
+    def get(self, key, fetch=None, ttl=None):
+        # Returns the cached data for `key` if it's younger than its TTL,
+        # otherwise calls fetch() (default: get_data(key)) and caches the result.
+        data = self.peek(key, ttl)
+        if data is not None:
+            return data
+
+        if fetch is None:
+            from tio_client import get_data
+            fetch = lambda: get_data(key)
+
+        data = fetch()
+        self.put(key, data)
+        return data
+
+    def invalidate(self, key=None):
+        # Forget one endpoint, or everything for this container if key is None.
+        with self._lock:
+            if key is None:
+                self._memory.clear()
+                for name in os.listdir(self._cache_dir()):
+                    if name.endswith('.json'):
+                        os.remove(os.path.join(self._cache_dir(), name))
+                return
+
+            self._memory.pop(key, None)
+            if os.path.exists(self._path(key)):
+                os.remove(self._path(key))
+
+def get_cache():
+    # The process-wide cache, scoped to the keys tio_client is using.
+    global _cache
+
+    with _cache_lock:
+        if _cache is None:
+            _cache = metadata_cache()
+
+    return _cache
+
+def cached_get_data(url_mod, ttl=None):
+    # Drop-in for tio_client.get_data() on metadata endpoints.
+    return get_cache().get(url_mod, ttl=ttl)
+
+def invalidate(url_mod=None):
+    get_cache().invalidate(url_mod)
@@ -0,0 +1,349 @@
+#!/usr/bin/env python
+#
+# Notes:
+# Shared Tenable.io API client used by the scripts in this repo. Rather than
+# every script calling requests.request() on its own (which opens a brand new
+# TCP/TLS connection to cloud.tenable.com per call), all calls go through one
+# requests.Session with a keep-alive connection pool. The API key headers are
+# set once on the session and reused for every request.
+#
+# Author: ThisTooShallXSS (https://github.com/thistooshallxss)
+# Requirements: Python 3, requests
+#
+# Usage:
+# - from tio_client import get_data, create_target_group, delete_asset
+# - scanners = get_data('/scanners')["scanners"]
+# - get_client().request('POST', '/scans', data=json_payload)
+# - deleted, unconfirmed = bulk_delete_assets(uuids)    # One request per BULK_DELETE_BATCH assets
+# - for tag in iter_items('/tags/values', 'values'): ...
+# - for finding in search_pages(tio.v3.explore.findings.search_host, 'findings', filter=...): ...
+#
+# API keys are resolved once per process, in this order:
+# - TIO_ACCESS_KEY / TIO_SECRET_KEY environment variables
+# - A JSON file named by TIO_KEYS_FILE ({"Access Key": "...", "Secret Key": "..."})
+# - ./keys.pickle (you'll be prompted to create it if it doesn't exist)
+#
+# Set TIO_BASE_URL (e.g. http://127.0.0.1:8080 for mock_tio_server.py) to
+# send every request somewhere other than cloud.tenable.com.
+#
+# Requests are paced by the shared scheduler in tio_scheduler.py, so a 429
+# from Tenable.io is retried (honoring Retry-After) instead of ending the run.
+#
+# Scripts in Pre-2020/ add the repo root to sys.path before importing this.
+
+import json, requests
+import os
+import sys
+import pickle
+import threading
+import time
+
+from requests.adapters import HTTPAdapter
+
+from tio_scheduler import get_scheduler
+
+requests.packages.urllib3.disable_warnings()
+
+BASE_URL = os.environ.get('TIO_BASE_URL', 'https://cloud.tenable.com') # Override to use mock_tio_server.py
+CONNECT_TIMEOUT = 10 # Seconds to wait while opening a connection.
+READ_TIMEOUT = 300 # Seconds to wait for a response. Large workbench queries can be slow.
+KEYS_PICKLE = './keys.pickle' # Written by save_keys() the first time a script runs.
+PAGE_SIZE = 5000 # Records requested per page by iter_pages()/iter_items().
+BULK_DELETE_BATCH = 1000 # Asset UUIDs per bulk delete request.
+SEARCH_MAX_PAGE_SIZE = 10000 # Largest page the v3 search endpoints hand back.
+SEARCH_FIRST_PAGE_SIZE = 50 # First search page when someone is watching the output, so results print right away.
+
+_client = None
+_client_lock = threading.Lock()
+
+def save_keys():
+    #assumption is that the user keys didn't work or don't exsist
+    print("Please provide your Tenable.io User API keys.")
+    access_key = input("Please provide your Access Key (use quotes): ")
+    secret_key = input("Please provide your Secret Key (use quotes): ")
+
+    dicts = {"Access Key": access_key, "Secret Key": secret_key}
+
+    pickle_out = open(KEYS_PICKLE, "wb")
+    pickle.dump(dicts, pickle_out)
+    pickle_out.close()
+
+    print("Now you have keys, re-run your command")
+    sys.exit()
+
+class credential_provider(object): # Resolves the API keys once per process and caches the headers.
+    def __init__(self, keys_file=None, pickle_file=KEYS_PICKLE):
+        self.keys_file = keys_file
+        self.pickle_file = pickle_file
+        self._headers = None
+        self._lock = threading.Lock()
+
+    def load_keys(self):
+        # 1. Environment variables, handy for cron jobs and containers.
+        access_key = os.environ.get('TIO_ACCESS_KEY', '')
+        secret_key = os.environ.get('TIO_SECRET_KEY', '')
+        if access_key and secret_key:
+            return access_key, secret_key
+
+        # 2. A JSON file of the same shape as keys.pickle: {"Access Key": ..., "Secret Key": ...}
+        keys_file = self.keys_file or os.environ.get('TIO_KEYS_FILE', '')
+        if keys_file:
+            with open(keys_file) as f:
+                keys = json.load(f)
+            return keys["Access Key"], keys["Secret Key"]
+
+        # 3. The keys.pickle written by save_keys(); if none, get them from the user.
+        if os.path.isfile(self.pickle_file) is False:
+            save_keys()
+
+        with open(self.pickle_file, "rb") as pickle_in:
+            keys = pickle.load(pickle_in)
+
+        return keys["Access Key"], keys["Secret Key"]
+
+    def headers(self):
+        # Only the first caller pays for reading the keys; every thread after
+        # that gets a copy of the cached dict.
+        with self._lock:
+            if self._headers is None:
+                access_key, secret_key = self.load_keys()
+                self._headers = {'Content-type':'application/json',
+                                 'X-ApiKeys':'accessKey='+access_key+';secretKey='+secret_key}
+
+        return dict(self._headers)
+
+    def reset(self):
+        # Forget the cached keys, e.g. after they've been rotated.
+        with self._lock:
+            self._headers = None
+
+_credentials = credential_provider()
+
+def grab_headers():
+    return _credentials.headers()
+
+class api_client(object): # One pooled session, shared by every call a script makes.
+    def __init__(self, headers=None, base_url=BASE_URL, pool_size=None,
+                 connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT, scheduler=None):
+        self.base_url = base_url
+        self.timeout = (connect_timeout, read_timeout)
+        self.scheduler = scheduler if scheduler else get_scheduler()
+
+        self.session = requests.Session()
+        self.session.verify = False
+        self.session.headers.update(headers if headers else grab_headers())
+
+        # pool_maxsize caps how many connections are kept alive per host, so it
+        # should be at least as large as the number of requests in flight. By
+        # default it matches the most the scheduler will ever let through;
+        # connections are only opened as they're needed.
+        pool_size = pool_size or self.scheduler.max_concurrency
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def request(self, req_type, url_mod, **kwargs):
+        # Throttled (429), unavailable (5xx) and dropped requests are retried
+        # per the shared scheduler; any other response is returned as-is.
+        # POSTs are only retried when that can't run them twice.
+        kwargs.setdefault('timeout', self.timeout)
+        attempt = 0
+
+        while True:
+            self.scheduler.acquire()
+
+            try:
+                r = self.session.request(req_type, self.base_url + url_mod, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self.scheduler.release(None)
+                delay = self.scheduler.retry_delay(attempt, method=req_type,
+                                                   connect_failed=isinstance(e, requests.ConnectTimeout))
+                if delay is None:
+                    raise
+            else:
+                self.scheduler.release(r.status_code)
+                delay = self.scheduler.retry_delay(attempt, r.status_code, r.headers.get('Retry-After'), req_type)
+                if delay is None:
+                    return r
+                r.close() # Hand the connection back to the pool (matters for stream=True).
+
+            attempt += 1
+            time.sleep(delay)
+
+    def close(self):
+        self.session.close()
+
+def get_client():
+    # Lazily build the process-wide client the first time it's needed.
+    global _client
+
+    with _client_lock:
+        if _client is None:
+            _client = api_client()
+
+    return _client
+
+def get_data(url_mod):
+    r = get_client().request('GET', url_mod)
+
+    if r.status_code != 200:
+        print('Status:', r.status_code, 'Problem with the GET request to {}. Exiting.'.format(url_mod))
+        sys.exit()
+
+    data = r.json()
+    return data
+
+def create_target_group(req_type, ip_addrs, name, tg_id=0):
+    # This makes the POST (or PUT, for an existing tg_id) request to build the target group on Tenable.io
+    json_payload = '{{"name":"{}","members":"{}","type":"system","acls":[{{"permissions":64,"type":"default"}}]}}'.format(name, ip_addrs)
+    url_mod = '/target-groups'
+
+    if tg_id > 0:
+        url_mod = url_mod + '/{}'.format(tg_id)
+
+    r = get_client().request(req_type, url_mod, data=json_payload)
+
+    if r.status_code != 200:
+        print('Status:', r.status_code, 'Problem with the {} request to create target group. Exiting.'.format(req_type))
+        sys.exit()
+
+    tgt_group_id = r.json()["id"]
+
+    # Our own cached copy of /target-groups is now stale.
+    from tio_cache import invalidate
+    invalidate('/target-groups')
+
+    return tgt_group_id
+
+def delete_asset(uuid):
+    r = get_client().request('DELETE', '/workbenches/assets/{}'.format(uuid))
+
+    if r.status_code != 202:
+        print('Status:', r.status_code, 'Problem with the DELETE asset request. Exiting.')
+        sys.exit()
+
+    return
+
+def bulk_delete_assets(uuids, batch_size=BULK_DELETE_BATCH, on_batch=None):
+    # Deletes assets through Tenable.io's bulk delete endpoint, batch_size
+    # UUIDs per request, instead of one DELETE per asset. The deletions are
+    # processed server-side. A batch that fails, or that Tenable.io matched
+    # fewer assets for than were sent, doesn't stop the rest; its UUIDs are
+    # returned as unconfirmed, since we can't tell which of them are gone.
+    # on_batch(batch) is only called for batches that were fully confirmed.
+    # Returns (number of assets Tenable.io matched, unconfirmed UUIDs).
+    uuids = list(uuids)
+    deleted = 0
+    unconfirmed = []
+
+    for x in range(0, len(uuids), batch_size):
+        batch = uuids[x:x + batch_size]
+        payload = {'query': {'or': [{'field': 'host.id', 'operator': 'eq', 'value': uuid} for uuid in batch]}}
+
+        try:
+            r = get_client().request('POST', '/api/v2/assets/bulk-jobs/delete', json=payload)
+        except requests.RequestException as e:
+            print('Problem with the bulk delete request for assets {}-{}: {}'.format(x + 1, x + len(batch), e))
+            unconfirmed.extend(batch)
+            continue
+
+        if r.status_code not in (200, 202):
+            print('Status:', r.status_code, 'Problem with the bulk delete request for assets {}-{}.'.format(x + 1, x + len(batch)))
+            unconfirmed.extend(batch)
+            continue
+
+        count = r.json()["response"]["data"]["asset_count"]
+        deleted += count
+
+        if count < len(batch):
+            unconfirmed.extend(batch)
+        elif on_batch:
+            on_batch(batch)
+
+    return deleted, unconfirmed
+
+def page_url(url_mod, offset, limit):
+    # Appends offset/limit to a url_mod that may or may not already have a query string.
+    sep = '&' if '?' in url_mod else '?'
+    return '{}{}offset={}&limit={}'.format(url_mod, sep, offset, limit)
+
+def _page_total(data):
+    # v2 list endpoints report {"pagination": {"total": N}}, workbenches report {"total": N}.
+    if isinstance(data.get('pagination'), dict):
+        return data['pagination'].get('total')
+    return data.get('total')
+
+def _fetch_page(url_mod, key, offset, limit):
+    data = get_data(page_url(url_mod, offset, limit))
+    return data.get(key) or [], _page_total(data)
+
+def iter_pages(url_mod, key, limit=PAGE_SIZE, offset=0, prefetch=True):
+    # Yields the list found under `key` for each page of url_mod, walking
+    # offset/limit until the endpoint runs dry. With prefetch on, the next page
+    # is requested on a background thread while the caller works through the
+    # current one, so at most two pages are ever held in memory.
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        pending = pool.submit(_fetch_page, url_mod, key, offset, limit)
+        first_record = None
+
+        while pending is not None:
+            records, total = pending.result()
+            pending = None
+
+            # Stop on an empty page, or if the endpoint ignored offset and sent
+            # the same page back again.
+            if len(records) == 0 or records[0] == first_record:
+                return
+
+            first_record = records[0]
+            offset += len(records)
+
+            # Trust the reported total when there is one: servers may cap the
+            # page size below `limit`. Without one, a short page is the last.
+            more = offset < total if total is not None else len(records) >= limit
+
+            if more and prefetch:
+                pending = pool.submit(_fetch_page, url_mod, key, offset, limit)
+
+            yield records
+
+            if more and not prefetch:
+                pending = pool.submit(_fetch_page, url_mod, key, offset, limit)
+
+def iter_items(url_mod, key, limit=PAGE_SIZE, offset=0, prefetch=True):
+    # Flattens iter_pages() into one record at a time.
+    for records in iter_pages(url_mod, key, limit, offset, prefetch):
+        for record in records:
+            yield record
+
+def search_pages(search, key, first_limit=None, **kwargs):
+    # Yields the records of a pyTenable v3 search function (e.g.
+    # tio.v3.explore.findings.search_host) one at a time, following the
+    # "next" token from page to page. kwargs (filter, fields, sort) are passed
+    # through; first_limit overrides the first page size. When the output is
+    # a terminal the first page is small, then each page doubles up to
+    # SEARCH_MAX_PAGE_SIZE. The next page is requested on a background thread
+    # while the caller prints the current one.
+    from concurrent.futures import ThreadPoolExecutor
+
+    def fetch_page(token, limit):
+        params = dict(kwargs, limit=limit, return_resp=True)
+        if token:
+            params['next'] = token
+        page = search(**params).json()
+        return page.get(key) or page.get('data') or [], (page.get('pagination') or {}).get('next')
+
+    limit = first_limit or (SEARCH_FIRST_PAGE_SIZE if sys.stdout.isatty() else SEARCH_MAX_PAGE_SIZE)
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        pending = pool.submit(fetch_page, None, limit)
+
+        while pending is not None:
+            records, token = pending.result()
+            limit = min(SEARCH_MAX_PAGE_SIZE, limit * 2)
+            pending = pool.submit(fetch_page, token, limit) if token and records else None
+
+            for record in records:
+                yield record
@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+#
+# Notes:
+# Columnar (Parquet) sink for v3 asset and findings exports. Reports used to
+# re-parse the exported JSON from the top every time they needed a couple of
+# columns. A parquet_sink takes the records as they stream out of an export
+# and writes them as compressed Parquet files, so a query over tens of
+# millions of findings reads only the columns (and partitions) it asks for.
+#
+# Records are flattened into one column per leaf field, named the way the
+# export payloads request them ("definition.vpr.score", "asset.id"). Lists of
+# objects, like tags or acr.drivers, become one list column per key
+# ("tags.category", "tags.value", "acr.drivers.name"). Only the fields in the
+# payload's field list are kept.
+#
+# Rows are buffered and written BATCH_ROWS at a time, one file per batch and
+# partition, laid out hive-style (state=ACTIVE/part-00000-0.parquet). On
+# close, the combined schema of every batch is written to _common_metadata, so
+# readers see one consistent set of columns even when a field was empty for a
+# whole batch. If the export fails part way, abort() removes the files the
+# sink wrote instead, so no partial dataset is left looking complete.
+#
+# Author: ThisTooShallXSS (https://github.com/thistooshallxss)
+# Requirements: Python 3, pyarrow
+#
+# Usage:
+# - from tio_columnar import parquet_sink, read_parquet
+# - with parquet_sink.for_payload(payload, 'parquet/vulns') as sink:
+# -     sink.add_many(iter_file_records('vulns.json'))
+# - table = read_parquet('parquet/vulns', columns=['asset.id', 'definition.vpr.score'])
+
+import os
+import threading
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+BATCH_ROWS = 100000 # Rows buffered before a batch is written out.
+COMPRESSION = 'zstd'
+METADATA_FILE = '_common_metadata'
+PARTITIONS = { # Default partition columns per export source.
+    'findings/vulnerabilities/host': ['state'],
+}
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError('The Parquet export sink needs pyarrow: pip install pyarrow')
+
+def flatten_record(record, prefix=''):
+    # {"asset": {"id": 1}, "tags": [{"category": "a"}]} -> {"asset.id": 1, "tags.category": ["a"]}
+    flat = {}
+
+    for key, value in record.items():
+        name = prefix + key
+
+        if isinstance(value, dict):
+            flat.update(flatten_record(value, name + '.'))
+        elif isinstance(value, list) and value and all(isinstance(item, dict) for item in value):
+            # One list column per key found in any of the objects.
+            rows = [flatten_record(item, name + '.') for item in value]
+            for column in sorted(set(k for row in rows for k in row)):
+                flat[column] = [row.get(column) for row in rows]
+        else:
+            flat[name] = value
+
+    return flat
+
+def _field_filter(fields):
+    # Returns keep(column) for a payload field list. A field keeps the column
+    # of the same name, and every column below it ("tags" keeps "tags.value").
+    # Tenable.io field names aren't case sensitive ("Id"), so neither is this.
+    if not fields:
+        return lambda column: True
+
+    wanted = set(field.lower() for field in fields)
+
+    def keep(column):
+        parts = column.lower().split('.')
+        return any('.'.join(parts[:x]) in wanted for x in range(1, len(parts) + 1))
+
+    return keep
+
+class parquet_sink(object): # Streams export records into a partitioned Parquet dataset.
+    def __init__(self, path, fields=None, partition_by=None, batch_rows=BATCH_ROWS, compression=COMPRESSION):
+        _require_pyarrow()
+        self.path = path
+        self.partition_by = list(partition_by or [])
+        self.batch_rows = batch_rows
+        self.compression = compression
+        self.rows = 0
+        self.schema = None
+        self._keep = _field_filter(fields)
+        self._columns = {} # name -> True, in the order columns were first seen
+        self._buffer = []
+        self._batch = 0
+        self._files = [] # Every file written so far, for abort().
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    @classmethod
+    def for_payload(cls, payload, path, **kwargs):
+        # A sink that keeps the fields the export payload asked for, and
+        # partitions by the default columns for its source.
+        kwargs.setdefault('partition_by', PARTITIONS.get(payload.get('source')))
+        return cls(path, fields=(payload.get('definition') or {}).get('fields'), **kwargs)
+
+    def add(self, record):
+        row = dict((k, v) for k, v in flatten_record(record).items() if self._keep(k))
+
+        with self._lock:
+            for column in row:
+                self._columns.setdefault(column, True)
+            self._buffer.append(row)
+            if len(self._buffer) >= self.batch_rows:
+                self._flush()
+
+    def add_many(self, records):
+        for record in records:
+            self.add(record)
+
+    def _flush(self):
+        if not self._buffer:
+            return
+
+        columns = list(self._columns)
+        for column in self.partition_by:
+            if column not in self._columns:
+                columns.append(column)
+
+        table = pa.Table.from_pydict(dict((c, [row.get(c) for row in self._buffer]) for c in columns))
+        self.schema = table.schema if self.schema is None else pa.unify_schemas(
+            [self.schema, table.schema], promote_options='permissive')
+
+        pq.write_to_dataset(table, self.path, partition_cols=self.partition_by or None,
+                            basename_template='part-{:05d}-{{i}}.parquet'.format(self._batch),
+                            compression=self.compression, existing_data_behavior='overwrite_or_ignore',
+                            file_visitor=lambda written: self._files.append(written.path))
+        self.rows += len(self._buffer)
+        self._batch += 1
+        self._buffer = []
+
+    def close(self):
+        # Writes whatever is still buffered, then the combined schema.
+        with self._lock:
+            self._flush()
+            if self.schema is not None:
+                data_schema = pa.schema([f for f in self.schema if f.name not in self.partition_by])
+                pq.write_metadata(data_schema, os.path.join(self.path, METADATA_FILE))
+
+    def abort(self):
+        # Drops whatever is still buffered and removes every file written,
+        # along with any partition directories left empty.
+        with self._lock:
+            self._buffer = []
+            for path in self._files + [os.path.join(self.path, METADATA_FILE)]:
+                if os.path.exists(path):
+                    os.remove(path)
+            self._files = []
+
+            for root, dirs, files in os.walk(self.path, topdown=False):
+                if not os.listdir(root):
+                    os.rmdir(root)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+def open_dataset(path):
+    # pyarrow dataset over a sink's output, partition columns included.
+    _require_pyarrow()
+    metadata = os.path.join(path, METADATA_FILE)
+    schema = pq.read_schema(metadata) if os.path.exists(metadata) else None
+    dataset = ds.dataset(path, format='parquet', partitioning='hive')
+
+    if schema is not None:
+        # Add the partition columns back, as the dataset discovered them.
+        schema = pa.unify_schemas([schema, pa.schema([f for f in dataset.schema if f.name not in schema.names])],
+                                  promote_options='permissive')
+        dataset = ds.dataset(path, format='parquet', partitioning='hive', schema=schema)
+
+    return dataset
+
+def read_parquet(path, columns=None, filter=None):
+    # Reads only the given columns (and the partitions the filter allows),
+    # e.g. filter=ds.field('state') == 'ACTIVE'.
+    return open_dataset(path).to_table(columns=columns, filter=filter)
@@ -0,0 +1,452 @@
+#!/usr/bin/env python
+#
+# Notes:
+# Helpers for Tenable.io v3 export jobs (/api/v3/exports/jobs): submit a job,
+# wait for it to finish, and download or walk the exported records. Exports
+# are the way to pull data out of containers with millions of assets or
+# findings, where the workbench endpoints cap or time out.
+#
+# run_exports() takes a batch of export payloads and runs them end to end,
+# unattended: every job is submitted, polled with a growing interval, and its
+# content downloaded as soon as it's ready, with the jobs overlapping rather
+# than running one after another.
+#
+# Content is streamed: downloads go to disk CHUNK_SIZE bytes at a time, and
+# iter_json_records() parses a JSON array or NDJSON stream one record at a
+# time, so memory stays flat however many gigabytes the export is.
+#
+# download_chunks() fetches a job's chunks on a bounded pool as soon as each
+# one is listed as available, while the job is still producing later ones,
+# and hands every chunk to a callback the moment it lands.
+#
+# download_export() writes to <path>.part and only renames it into place once
+# the size (and the MD5 ETag, when the server sends one) checks out. A dropped
+# connection is retried, picking up with a Range request from the bytes already
+# on disk, so a flaky link never costs a full re-download; a .part file left by
+# an interrupted run is resumed the same way.
+#
+# run_exports() can also hand every export's records to a sink as each chunk
+# lands (see tio_columnar.parquet_sink), e.g. to keep a columnar copy.
+#
+# Export generation is the slow part, so run_exports() remembers each job it
+# completes under export_key(payload) (in tio_cache, per container). A payload
+# that asks for exactly the same data within REUSE_MAX_AGE (and before the job
+# expires) downloads the finished job again instead of queueing a new one, and
+# files already downloaded from that job aren't fetched twice.
+#
+# Author: ThisTooShallXSS (https://github.com/thistooshallxss)
+# Requirements: Python 3, requests (for tio_client.py)
+#
+# Usage:
+# - from tio_exports import export_records, run_exports
+# - payload = {"name": "...", "source": "assets", "format": "json", "definition": {"fields": [...], "filter": {...}}}
+# - for asset in export_records(payload): ...
+# - results = run_exports([assets_payload, vulns_payload], output_dir='exports')
+#
+# Or step by step:
+# - job_id = create_export(payload); wait_for_export(job_id)
+# - download_export(job_id, 'assets.json')
+# - for record in iter_file_records('assets.json'): ...
+# - download_chunks(job_id, lambda job_id, chunk_id, path: ..., output_dir='chunks')
+# - export_key(payload)   # Same hash for any payload that exports the same data
+
+import codecs
+import hashlib
+import json
+import os
+import re
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from tio_cache import get_cache
+from tio_client import get_client
+from tio_scheduler import get_scheduler
+
+EXPORT_URL = '/api/v3/exports/jobs'
+POLL_INTERVAL = 1 # Seconds before the first status check; grows by POLL_BACKOFF after each.
+POLL_BACKOFF = 1.5
+POLL_MAX = 30 # Longest wait between two status checks.
+EXPORT_TIMEOUT = 3600 # Seconds to wait for an export to finish before giving up.
+EXPORT_CONCURRENCY = 4 # Export jobs run_exports() drives at once.
+CHUNK_SIZE = 1024 * 1024 # Bytes read from the network or disk at a time.
+CHUNK_CONCURRENCY = 4 # Export chunks downloaded at once, per job.
+FAILED_STATUSES = ('FAILED', 'ERROR', 'CANCELLED')
+REUSE_MAX_AGE = 900 # Seconds a finished job is reused for identical payloads.
+PART_SUFFIX = '.part' # Downloads in progress; renamed once verified.
+TRANSIENT_ERRORS = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)
+
+class export_error(Exception): # An export job couldn't be created, failed, or couldn't be downloaded.
+    pass
+
+class export_result(object): # What run_exports() did with one payload.
+    def __init__(self, name, job_id=None, path=None, error=None):
+        self.name = name
+        self.id = job_id
+        self.path = path # The content file, or the chunk directory when chunked.
+        self.chunks = None # Chunk file paths, in chunk order, when chunked.
+        self.sink = None # What sink_factory returned, closed once the export is done.
+        self.reused = False # True if an earlier identical job was downloaded instead.
+        self.error = error
+
+def create_export(payload):
+    r = get_client().request('POST', EXPORT_URL, json=payload)
+
+    if r.status_code != 200:
+        raise export_error('Status: {} Problem with the request to create the export job.'.format(r.status_code))
+
+    return r.json()["id"]
+
+def export_status(job_id):
+    r = get_client().request('GET', '{}/{}'.format(EXPORT_URL, job_id))
+
+    if r.status_code != 200:
+        raise export_error('Status: {} Problem with the export status request for {}.'.format(r.status_code, job_id))
+
+    return r.json()
+
+def wait_for_export(job_id, poll_interval=POLL_INTERVAL, timeout=EXPORT_TIMEOUT):
+    # Polls until the job is FINISHED, and returns its final status. The wait
+    # between checks starts at poll_interval and grows to at most POLL_MAX.
+    deadline = time.monotonic() + timeout
+
+    while True:
+        status = export_status(job_id)
+
+        if status["status"] == 'FINISHED':
+            return status
+
+        if status["status"] in FAILED_STATUSES:
+            raise export_error('Export job {} ended with status {}.'.format(job_id, status["status"]))
+
+        if time.monotonic() >= deadline:
+            raise export_error('Export job {} did not finish within {} seconds.'.format(job_id, timeout))
+
+        time.sleep(min(poll_interval, max(0, deadline - time.monotonic())))
+        poll_interval = min(POLL_MAX, poll_interval * POLL_BACKOFF)
+
+def _content(job_id, chunk_id=None, offset=0):
+    # The content (or one chunk's) response, with the body still unread. With
+    # an offset, asks for the rest of the body from that byte on: the server
+    # answers 206 (partial), 200 (ignored the Range) or 416 (nothing left).
+    if chunk_id is None:
+        url_mod = '{}/{}/content'.format(EXPORT_URL, job_id)
+    else:
+        url_mod = '{}/{}/chunks/{}'.format(EXPORT_URL, job_id, chunk_id)
+
+    headers = {'Range': 'bytes={}-'.format(offset), 'Accept-Encoding': 'identity'} if offset else None
+    r = get_client().request('GET', url_mod, stream=True, headers=headers)
+
+    if r.status_code not in ((200, 206, 416) if offset else (200,)):
+        r.close()
+        raise export_error('Status: {} Problem downloading {}.'.format(r.status_code, url_mod))
+
+    return r
+
+def _total_size(r, offset):
+    # Full size of the body, from Content-Range on a 206, Content-Length on a
+    # 200, or None if the server didn't say (e.g. a compressed response).
+    if r.status_code in (206, 416):
+        total = (r.headers.get('Content-Range') or '').rpartition('/')[2]
+        return int(total) if total.isdigit() else None
+
+    if r.headers.get('Content-Encoding', 'identity') == 'identity' and r.headers.get('Content-Length', '').isdigit():
+        return int(r.headers['Content-Length'])
+
+    return None
+
+def _etag_md5(r):
+    # The ETag, when it's a plain MD5 of the body; anything else can't be checked.
+    etag = (r.headers.get('ETag') or '').strip('"')
+    return etag.lower() if re.match(r'^[0-9A-Fa-f]{32}$', etag) else None
+
+def _file_md5(path):
+    md5 = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+def download_export(job_id, path, chunk_id=None, retries=None):
+    # Streams the content of a FINISHED export job (or one available chunk)
+    # to path, via path.part. Dropped connections are retried (as many times
+    # as the shared scheduler allows, unless `retries` says otherwise),
+    # resuming from the bytes already written. The file is only renamed into
+    # place once its size and checksum match what the server advertised.
+    part = path + PART_SUFFIX
+    attempt = 0
+    total = None
+    md5 = None
+
+    while True:
+        offset = os.path.getsize(part) if os.path.exists(part) else 0
+
+        try:
+            with _content(job_id, chunk_id, offset) as r:
+                total = _total_size(r, offset) or total
+                md5 = _etag_md5(r) or md5
+
+                if r.status_code != 416:
+                    # 206 continues where we left off; 200 is the whole body again.
+                    with open(part, 'ab' if r.status_code == 206 else 'wb') as f:
+                        for chunk in r.iter_content(CHUNK_SIZE):
+                            f.write(chunk)
+        except TRANSIENT_ERRORS:
+            delay = get_scheduler().retry_delay(attempt)
+            if delay is None or (retries is not None and attempt >= retries):
+                raise export_error('Gave up downloading export {} after {} retries; {} kept for the next run.'.format(
+                    job_id, attempt, part))
+            attempt += 1
+            time.sleep(delay)
+            continue
+
+        break
+
+    size = os.path.getsize(part)
+    if (total is not None and size != total) or (md5 is not None and _file_md5(part) != md5):
+        os.remove(part)
+        raise export_error('Download of export {} failed verification ({} of {} bytes); removed {}.'.format(
+            job_id, size, total, part))
+
+    os.replace(part, path)
+    return path
+
+def _download_chunk(job_id, chunk_id, output_dir, on_chunk):
+    path = os.path.join(output_dir, '{}.json'.format(chunk_id))
+    if not os.path.exists(path): # Only ever renamed into place once complete.
+        download_export(job_id, path, None if chunk_id == 'content' else chunk_id)
+
+    if on_chunk:
+        on_chunk(job_id, chunk_id, path)
+
+    return path
+
+def download_chunks(job_id, on_chunk=None, output_dir='.', concurrency=CHUNK_CONCURRENCY,
+                    poll_interval=POLL_INTERVAL, timeout=EXPORT_TIMEOUT):
+    # Polls the job and downloads every chunk listed in chunks_available as
+    # soon as it shows up, up to `concurrency` at a time, without waiting for
+    # the whole job to finish. on_chunk(job_id, chunk_id, path) is called
+    # (on a worker thread) as each chunk lands. Returns the chunk paths in
+    # chunk order. A job that doesn't report chunks is downloaded whole, as
+    # one chunk, once it finishes.
+    os.makedirs(output_dir, exist_ok=True)
+    deadline = time.monotonic() + timeout
+    interval = poll_interval
+    pending = {}
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        while True:
+            status = export_status(job_id)
+
+            if status["status"] in FAILED_STATUSES:
+                raise export_error('Export job {} ended with status {}.'.format(job_id, status["status"]))
+
+            available = status.get('chunks_available')
+            if available is None and status["status"] == 'FINISHED':
+                available = ['content']
+
+            new = [chunk_id for chunk_id in available or [] if chunk_id not in pending]
+            for chunk_id in new:
+                pending[chunk_id] = pool.submit(_download_chunk, job_id, chunk_id, output_dir, on_chunk)
+
+            if status["status"] == 'FINISHED':
+                break
+
+            if time.monotonic() >= deadline:
+                raise export_error('Export job {} did not finish within {} seconds.'.format(job_id, timeout))
+
+            # Poll quickly while chunks keep arriving, back off while they don't.
+            interval = poll_interval if new else min(POLL_MAX, interval * POLL_BACKOFF)
+            time.sleep(min(interval, max(0, deadline - time.monotonic())))
+
+        return [pending[chunk_id].result() for chunk_id in sorted(pending)]
+
+def _decode(chunks):
+    # bytes chunks -> text chunks, without splitting a multi-byte character.
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    for chunk in chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+def iter_json_records(chunks):
+    # Yields records one at a time from text chunks that together hold either
+    # a JSON array of records or NDJSON (one record per line). Only the
+    # unparsed tail of the stream is ever kept in memory.
+    decoder = json.JSONDecoder()
+    buf = ''
+    pos = 0
+    chunks = iter(chunks)
+    done = False
+
+    while True:
+        # Skip whitespace and the array punctuation between records.
+        while pos < len(buf) and buf[pos] in ' \t\r\n,[]':
+            pos += 1
+
+        if pos < len(buf):
+            try:
+                record, end = decoder.raw_decode(buf, pos)
+            except ValueError:
+                if done:
+                    raise export_error('Export content is not valid JSON near: {!r}'.format(buf[pos:pos + 80]))
+                pass # Incomplete record; read more below.
+            else:
+                if end < len(buf) or done:
+                    pos = end
+                    yield record
+                    continue
+                # Parsed right up to the end of the buffer: a number or string
+                # could still continue in the next chunk, so read more first.
+
+        if done:
+            return
+
+        chunk = next(chunks, None)
+        if chunk is None:
+            done = True
+        else:
+            buf = buf[pos:] + chunk
+            pos = 0
+
+def iter_file_records(path):
+    # Yields the records of a downloaded export file (JSON array or NDJSON).
+    with open(path, 'rb') as f:
+        for record in iter_json_records(_decode(iter(lambda: f.read(CHUNK_SIZE), b''))):
+            yield record
+
+def iter_export_records(job_id):
+    # Yields each record of a FINISHED export job, parsed as it streams in.
+    with _content(job_id) as r:
+        for record in iter_json_records(_decode(r.iter_content(CHUNK_SIZE))):
+            yield record
+
+def export_records(payload, poll_interval=POLL_INTERVAL):
+    # Submits the export, waits for it, and yields its records.
+    job_id = create_export(payload)
+    wait_for_export(job_id, poll_interval=poll_interval)
+
+    for record in iter_export_records(job_id):
+        yield record
+
+def _normalize(value):
+    # Order-independent form of a definition: keys sorted, lists sorted.
+    if isinstance(value, dict):
+        return dict((k, _normalize(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return sorted((_normalize(v) for v in value), key=lambda v: json.dumps(v, sort_keys=True))
+    return value
+
+def export_key(payload):
+    # Stable hash of what an export returns (source, fields, filter), ignoring
+    # its name, expiration, and the order fields and filters are listed in.
+    definition = payload.get('definition') or {}
+    normalized = {
+        'source': payload.get('source'),
+        'format': payload.get('format', 'json'),
+        'fields': sorted(set(field.lower() for field in definition.get('fields') or [])),
+        'filter': _normalize(definition.get('filter')),
+    }
+    return hashlib.sha256(json.dumps(normalized, sort_keys=True).encode()).hexdigest()[:24]
+
+def _reuse_key(payload):
+    return 'export-job:' + export_key(payload)
+
+def remember_export(payload, job_id):
+    # Records a FINISHED job as the latest one for its definition.
+    get_cache().put(_reuse_key(payload), {'id': job_id})
+
+def forget_export(payload):
+    # Stops find_reusable_export() handing out the job remembered for payload.
+    get_cache().invalidate(_reuse_key(payload))
+
+def find_reusable_export(payload, max_age=REUSE_MAX_AGE):
+    # The id of a FINISHED job for the same definition, completed less than
+    # max_age seconds ago and not yet expired, or None.
+    ttl = max_age
+    if payload.get('expiration'):
+        ttl = min(ttl, payload['expiration'] * 86400) # Export expiration is in days.
+
+    entry = get_cache().peek(_reuse_key(payload), ttl)
+    if entry is None:
+        return None
+
+    try:
+        status = export_status(entry['id'])
+    except export_error:
+        return None # Expired or purged server-side.
+
+    return entry['id'] if status["status"] == 'FINISHED' else None
+
+def export_filename(payload, job_id):
+    # e.g. {"name": "Nightly vulns", "format": "json"} -> Nightly_vulns-<job_id>.json
+    name = re.sub(r'[^0-9A-Za-z.-]+', '_', payload.get('name') or payload.get('source') or 'export').strip('_')
+    return '{}-{}.{}'.format(name, job_id, payload.get('format', 'json'))
+
+def _run_export(payload, output_dir, poll_interval, chunked, on_chunk, sink_factory, reuse):
+    result = export_result(payload.get('name'))
+
+    def chunk_saved(job_id, chunk_id, path):
+        if result.sink is not None:
+            result.sink.add_many(iter_file_records(path))
+        if on_chunk:
+            on_chunk(job_id, chunk_id, path)
+
+    try:
+        result.id = find_reusable_export(payload, reuse) if reuse else None
+        result.reused = result.id is not None
+        if not result.reused:
+            result.id = create_export(payload)
+        path = os.path.join(output_dir, export_filename(payload, result.id))
+
+        if sink_factory:
+            result.sink = sink_factory(payload, result.id)
+
+        if chunked or on_chunk or sink_factory:
+            result.path = os.path.splitext(path)[0]
+            result.chunks = download_chunks(result.id, chunk_saved, result.path, poll_interval=poll_interval)
+        else:
+            wait_for_export(result.id, poll_interval=poll_interval)
+            result.path = path if os.path.exists(path) else download_export(result.id, path)
+
+        if not result.reused:
+            remember_export(payload, result.id)
+
+        if result.sink is not None:
+            result.sink.close()
+    except Exception as e:
+        result.error = e
+
+        if result.sink is not None:
+            # Don't leave a partial copy behind that looks like a finished one.
+            getattr(result.sink, 'abort', result.sink.close)()
+
+    return result
+
+def run_exports(payloads, output_dir='.', concurrency=EXPORT_CONCURRENCY, poll_interval=POLL_INTERVAL,
+                chunked=False, on_chunk=None, sink_factory=None, reuse=REUSE_MAX_AGE):
+    # Submits, polls and downloads every payload, up to `concurrency` at a
+    # time. Returns one export_result per payload, in the same order. A job
+    # that fails doesn't stop the others; check each result's error.
+    #
+    # With chunked (or an on_chunk callback), each export is saved as a
+    # directory of chunk files, downloaded in parallel as they become ready.
+    #
+    # sink_factory(payload, job_id) returns a sink (anything with add_many()
+    # and close()) that is fed each chunk's records as the chunk lands. If the
+    # export fails, the sink's abort() is called instead of close(), when it
+    # has one.
+    #
+    # reuse is how old (in seconds) a finished job for the same definition may
+    # be and still be downloaded instead of creating a new one; 0 disables it.
+    os.makedirs(output_dir, exist_ok=True)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(_run_export, payload, output_dir, poll_interval, chunked, on_chunk, sink_factory, reuse)
+                   for payload in payloads]
+        return [future.result() for future in futures]
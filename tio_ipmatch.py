@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+#
+# Notes:
+# Bulk IP to CIDR matching for the asset filtering scripts. The old
+# addressInNetwork() re-parsed the CIDR and rebuilt each IP through hex
+# strings one address at a time. A cidr_matcher parses its networks once,
+# merges them into sorted, non-overlapping integer intervals, and then:
+# - Checks one address with a binary search (contains).
+# - Checks a whole list at once (select): IPv4 addresses are packed into a
+#   uint32 NumPy array and matched with a single searchsorted, so a million
+#   asset IPs against any number of prefixes takes milliseconds.
+#
+# prefix_index combines an allow list and an optional deny list. scan_scope()
+# builds one from the ranges a user passed on the command line, limited to
+# INTERNAL_NETWORKS (RFC 1918, loopback, IPv6 unique local). Every lookup is a
+# couple of binary searches, however many ranges were given.
+#
+# NumPy is optional. Without it, select() falls back to a binary search per
+# address, which is slower but gives the same answers. IPv6 addresses always
+# take that path.
+#
+# Author: ThisTooShallXSS (https://github.com/thistooshallxss)
+# Requirements: Python 3, numpy (optional)
+#
+# Usage:
+# - from tio_ipmatch import cidr_matcher
+# - matcher = cidr_matcher('10.0.0.0/8,192.168.1.0/24')
+# - matcher.contains('10.1.2.3')                       # True
+# - matcher.select(['10.1.2.3', '8.8.8.8', '::1'])     # [0], the indexes that match
+# - addrs, positions = pack_ipv4(ips); matcher.match_packed(addrs)   # Reuse one packing
+# - is_internal('192.168.1.5')                        # True
+# - scan_scope('10.0.0.0/8,8.8.8.0/24').contains(ip)  # In range and internal
+
+import bisect
+import functools
+import ipaddress
+import socket
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+INTERNAL_NETWORKS = ('10.0.0.0/8', '172.16.0.0/12', '192.168.0.0/16', '127.0.0.0/8', 'fc00::/7', '::1/128')
+
+def _merge(intervals):
+    # Sorts [start, end] pairs and merges any that overlap or touch.
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+def pack_ipv4(ips):
+    # Returns (uint32 array, positions): the IPv4 addresses in ips as one
+    # array, and where each one sits in the original list. Anything that isn't
+    # a plain IPv4 address is left out.
+    packed = []
+    positions = []
+
+    for x, ip in enumerate(ips):
+        try:
+            packed.append(socket.inet_pton(socket.AF_INET, ip))
+        except (OSError, TypeError, ValueError):
+            continue
+        positions.append(x)
+
+    return np.frombuffer(b''.join(packed), dtype='>u4').astype(np.uint32), positions
+
+class cidr_matcher(object): # A set of networks, compiled once, matched many times.
+    def __init__(self, networks):
+        if isinstance(networks, str):
+            networks = networks.split(',')
+
+        intervals = {4: [], 6: []}
+        for net in networks:
+            net = ipaddress.ip_network(str(net).strip(), strict=False)
+            intervals[net.version].append((int(net.network_address), int(net.broadcast_address)))
+
+        self.networks = {}
+        for version, spans in intervals.items():
+            merged = _merge(spans)
+            self.networks[version] = ([s for s, e in merged], [e for s, e in merged])
+
+        if np is not None:
+            starts, ends = self.networks[4]
+            self._v4_starts = np.array(starts, dtype=np.uint32)
+            self._v4_ends = np.array(ends, dtype=np.uint32)
+
+    def _contains_int(self, version, addr):
+        starts, ends = self.networks[version]
+        x = bisect.bisect_right(starts, addr) - 1
+        return x >= 0 and addr <= ends[x]
+
+    def contains(self, ip):
+        try:
+            return self._contains_int(4, int.from_bytes(socket.inet_pton(socket.AF_INET, ip), 'big'))
+        except (OSError, TypeError, ValueError):
+            pass
+
+        try:
+            addr = ipaddress.ip_address(ip.strip() if isinstance(ip, str) else ip)
+        except ValueError:
+            return False
+        return self._contains_int(addr.version, int(addr))
+
+    def match_packed(self, addrs):
+        # Boolean array: which of the uint32 addresses (see pack_ipv4) fall
+        # inside a network. Needs NumPy.
+        if len(self._v4_starts) == 0:
+            return np.zeros(len(addrs), dtype=bool)
+
+        x = np.searchsorted(self._v4_starts, addrs, side='right') - 1
+        return (x >= 0) & (addrs <= self._v4_ends[np.maximum(x, 0)])
+
+    def select(self, ips):
+        # Returns the (sorted) indexes of the entries in ips that fall inside
+        # any of the networks. Unparseable entries never match.
+        if np is None:
+            return [x for x, ip in enumerate(ips) if self.contains(ip)]
+
+        addrs, positions = pack_ipv4(ips)
+        hits = np.asarray(positions, dtype=np.int64)[self.match_packed(addrs)].tolist()
+
+        if len(positions) < len(ips):
+            # IPv6, or IPv4 with stray whitespace etc. Rare; check one by one.
+            v4 = set(positions)
+            hits.extend(x for x, ip in enumerate(ips) if x not in v4 and self.contains(ip))
+            hits.sort()
+
+        return hits
+
+@functools.lru_cache(maxsize=64)
+def compile_networks(networks):
+    # Cached cidr_matcher for a comma separated network string.
+    return cidr_matcher(networks)
+
+def ip_in_networks(ip, networks):
+    # Single-address check against a comma separated network string.
+    return compile_networks(networks).contains(ip)
+
+class prefix_index(object): # Allow list, minus a deny list, optionally limited to another list.
+    def __init__(self, allow, deny=None, within=None):
+        self.allow = cidr_matcher(allow)
+        self.deny = cidr_matcher(deny) if deny else None
+        self.within = cidr_matcher(within) if within else None
+
+    def contains(self, ip):
+        if not self.allow.contains(ip):
+            return False
+        if self.within is not None and not self.within.contains(ip):
+            return False
+        return self.deny is None or not self.deny.contains(ip)
+
+    def select(self, ips):
+        # Same as cidr_matcher.select(), applying all three lists.
+        hits = self.allow.select(ips)
+
+        if self.within is not None:
+            hits = [hits[x] for x in self.within.select([ips[y] for y in hits])]
+        if self.deny is not None:
+            denied = set(hits[x] for x in self.deny.select([ips[y] for y in hits]))
+            hits = [x for x in hits if x not in denied]
+
+        return hits
+
+_internal = cidr_matcher(INTERNAL_NETWORKS)
+
+def is_internal(ip):
+    # RFC 1918, loopback or IPv6 unique local. False for anything unparseable.
+    return _internal.contains(ip)
+
+@functools.lru_cache(maxsize=16)
+def scan_scope(allowed, denied=None):
+    # prefix_index for comma separated allowed (and denied) ranges, limited to
+    # internal addresses. Compiled once per distinct set of ranges.
+    return prefix_index(allowed, denied, within=INTERNAL_NETWORKS)
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+#
+# Notes:
+# Helpers that make a large asset purge resumable. Before deleting anything,
+# the delete_assets scripts write the full list of matching UUIDs to an
+# append-only journal. Each UUID is then appended again as soon as its
+# deletion succeeds. If the run crashes or is interrupted, the next run with
+# the same CIDR, against the same container and API keys, reads the journal
+# and picks up with whatever is left, without re-fetching the asset list or
+# re-deleting anything. Once everything is deleted, the journal is removed.
+#
+# rate_meter prints a live "deleted / total (rate)" line while the purge runs.
+#
+# Author: ThisTooShallXSS (https://github.com/thistooshallxss)
+# Requirements: Python 3
+#
+# Usage:
+# - journal = purge_journal(journal_path('10.18.0.0/16'))
+# - uuids = journal.remaining() if journal.planned else find_matching_hosts(...)
+# - journal.plan(uuids); ... journal.record(uuid) per deletion ...; journal.close()
+
+import hashlib
+import os
+import re
+import sys
+import threading
+import time
+
+JOURNAL_DIR = '.' # Where purge journals are written.
+
+def _default_scope():
+    # The container (base URL) and access key the purge runs against.
+    from tio_client import BASE_URL, grab_headers
+
+    return BASE_URL + '|' + grab_headers()['X-ApiKeys'].split(';')[0]
+
+def journal_path(name, scope=None):
+    # e.g. '10.18.0.0/16' -> ./purge-10.18.0.0_16-<hash of scope>.journal, so a
+    # purge is never resumed against a different container or set of keys.
+    scope = scope if scope is not None else _default_scope()
+    return os.path.join(JOURNAL_DIR, 'purge-{}-{}.journal'.format(
+        re.sub(r'[^0-9A-Za-z.:-]+', '_', name), hashlib.sha256(scope.encode()).hexdigest()[:12]))
+
+class purge_journal(object): # Append-only record of what a purge planned and what it has deleted.
+    def __init__(self, path):
+        self.path = path
+        self.planned = []
+        self.deleted = set()
+        self._file = None
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path) as f:
+            for line in f:
+                if not line.endswith('\n'):
+                    break # A write cut short by a crash; that UUID just gets deleted again.
+
+                fields = line.split()
+                if len(fields) != 2:
+                    continue # A blank or garbled line, e.g. from a crash mid-write.
+
+                action, uuid = fields
+                if action == 'plan':
+                    self.planned.append(uuid)
+                elif action == 'deleted':
+                    self.deleted.add(uuid)
+
+    def _append(self, lines):
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'a', buffering=1)
+            self._file.write(''.join(lines))
+            self._file.flush()
+
+    def plan(self, uuids):
+        # Records the full set of UUIDs this purge will delete.
+        self.planned = list(uuids)
+        self._append(['plan {}\n'.format(uuid) for uuid in self.planned])
+
+    def record(self, uuids):
+        # Marks one UUID (or a list of them) as deleted.
+        if isinstance(uuids, str):
+            uuids = [uuids]
+
+        self._append(['deleted {}\n'.format(uuid) for uuid in uuids])
+        with self._lock:
+            self.deleted.update(uuids)
+
+    def remaining(self):
+        return [uuid for uuid in self.planned if uuid not in self.deleted]
+
+    def close(self):
+        # Removes the journal once nothing is left to delete; otherwise keeps
+        # it so the next run can resume.
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+        if os.path.exists(self.path) and not self.remaining():
+            os.remove(self.path)
+
+class rate_meter(object): # Live progress line: done / total and the rate so far.
+    def __init__(self, total, label='Deleted', interval=1.0, stream=None):
+        self.total = total
+        self.label = label
+        self.interval = interval
+        self.stream = stream if stream else sys.stdout
+        self.done = 0
+        self.started = time.monotonic()
+        self._printed = 0.0
+        self._lock = threading.Lock()
+
+    def rate(self):
+        elapsed = time.monotonic() - self.started
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    def add(self, count=1):
+        with self._lock:
+            self.done += count
+            now = time.monotonic()
+            if now - self._printed >= self.interval or self.done >= self.total:
+                self._printed = now
+                self.stream.write('\r{}: {}/{} ({:.1f}/s)'.format(self.label, self.done, self.total, self.rate()))
+                self.stream.flush()
+
+    def finish(self):
+        self.stream.write('\n')
+        self.stream.flush()
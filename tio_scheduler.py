@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+#
+# Notes:
+# Rate-limit-aware request scheduler shared by tio_client.py and tio_async.py.
+# Every request made by any script in this repo goes through one process-wide
+# scheduler, which:
+# - Meters request starts through a token bucket (RATE per second, BURST deep).
+# - Caps how many requests are in flight, growing that cap by one after each
+#   healthy response and halving it whenever Tenable.io throttles us (AIMD).
+# - Decides whether a failed request should be retried, and for how long to
+#   wait first: the server's Retry-After if given, otherwise exponential
+#   backoff with full jitter.
+#
+# Author: ThisTooShallXSS (https://github.com/thistooshallxss)
+# Requirements: Python 3
+#
+# RATE and BURST can be overridden with the TIO_RATE and TIO_BURST environment
+# variables, e.g. to lift the limit when testing against mock_tio_server.py.
+#
+# Usage:
+# - scheduler = get_scheduler()
+# - scheduler.acquire()                 # or: await scheduler.acquire_async()
+# - ... send the request ...
+# - scheduler.release(r.status_code)
+# - delay = scheduler.retry_delay(attempt, r.status_code, r.headers.get('Retry-After'), method='GET')
+
+import asyncio
+import os
+import random
+import threading
+import time
+
+RATE = float(os.environ.get('TIO_RATE', 20)) # Requests per second allowed to start, averaged over time.
+BURST = float(os.environ.get('TIO_BURST', 40)) # Requests that may start back to back before RATE kicks in.
+MIN_CONCURRENCY = 1
+MAX_CONCURRENCY = 200
+INITIAL_CONCURRENCY = 16
+MAX_RETRIES = 6 # Attempts after the first, before giving up on a request.
+BACKOFF_BASE = 1.0 # Seconds; doubled for each retry, before jitter.
+BACKOFF_MAX = 60.0 # Longest we'll ever sleep between two attempts.
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+THROTTLE_STATUSES = (429, 503)
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE') # Safe to send twice.
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+class token_bucket(object): # Classic token bucket; thread-safe, never blocks itself.
+    def __init__(self, rate=RATE, burst=BURST):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        # Takes one token, and returns how many seconds the caller must wait
+        # before it's allowed to use it (0 if one was already available).
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+
+            if self.tokens >= 0:
+                return 0.0
+
+            return -self.tokens / self.rate
+
+    def pause(self, seconds):
+        # Drains the bucket so nobody starts a request for `seconds`. Used when
+        # the server tells us to back off with Retry-After.
+        with self._lock:
+            self.tokens = min(self.tokens, -seconds * self.rate)
+            self.updated = time.monotonic()
+
+class request_scheduler(object): # Token bucket + adaptive concurrency + retry policy.
+    def __init__(self, rate=RATE, burst=BURST, initial_concurrency=INITIAL_CONCURRENCY,
+                 min_concurrency=MIN_CONCURRENCY, max_concurrency=MAX_CONCURRENCY,
+                 max_retries=MAX_RETRIES, backoff_base=BACKOFF_BASE, backoff_max=BACKOFF_MAX):
+        self.bucket = token_bucket(rate, burst)
+        self.limit = float(initial_concurrency)
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.in_flight = 0
+        self.throttled = 0 # Total 429/503 responses seen, for reporting.
+        self._cond = threading.Condition()
+        self._async_waiters = [] # (loop, future) for each acquire_async() waiting on a slot.
+
+    def acquire(self):
+        # Blocks the calling thread until it may start a request.
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+        time.sleep(self.bucket.reserve())
+
+    async def acquire_async(self):
+        # Same as acquire(), without blocking the event loop. Rather than
+        # polling for a free slot, it waits for release() to wake it up.
+        loop = asyncio.get_running_loop()
+
+        while True:
+            with self._cond:
+                if self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    break
+                waiter = loop.create_future()
+                self._async_waiters.append((loop, waiter))
+            await waiter
+
+        await asyncio.sleep(self.bucket.reserve())
+
+    def release(self, status=None):
+        # Call once per acquire(), with the response status (None on a
+        # connection error). Adjusts the concurrency cap: additive increase
+        # when healthy, multiplicative decrease when throttled.
+        with self._cond:
+            self.in_flight -= 1
+
+            if status in THROTTLE_STATUSES:
+                self.throttled += 1
+                self.limit = max(self.min_concurrency, self.limit / 2)
+            elif status is not None and status < 400:
+                self.limit = min(self.max_concurrency, self.limit + 1.0 / max(1.0, self.limit))
+
+            self._cond.notify_all()
+            waiters, self._async_waiters = self._async_waiters, []
+
+        for loop, waiter in waiters:
+            if not waiter.done() and not loop.is_closed():
+                loop.call_soon_threadsafe(_wake, waiter)
+
+    def retry_delay(self, attempt, status=None, retry_after=None, method='GET', connect_failed=False):
+        # Returns the seconds to sleep before retrying, or None if the request
+        # shouldn't (or can no longer) be retried. status=None means the
+        # request never got a response, e.g. a connection reset or timeout;
+        # connect_failed says it never even reached the server.
+        #
+        # A POST whose response was lost may already have launched a scan or
+        # created a target group, so non-idempotent methods are only retried
+        # when the server explicitly throttled them (Retry-After) or the
+        # connection was never made.
+        if attempt >= self.max_retries:
+            return None
+
+        if status is not None and status not in RETRY_STATUSES:
+            return None
+
+        if (method or 'GET').upper() not in IDEMPOTENT_METHODS:
+            if status is None and not connect_failed:
+                return None
+            if status is not None and (status not in THROTTLE_STATUSES or not retry_after):
+                return None
+
+        delay = parse_retry_after(retry_after)
+
+        if delay is not None:
+            self.bucket.pause(delay)
+            return min(delay, self.backoff_max)
+
+        # Full jitter keeps a crowd of throttled workers from retrying in lockstep.
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+def _wake(waiter):
+    if not waiter.done(): # It may have been cancelled while it waited.
+        waiter.set_result(None)
+
+def parse_retry_after(value):
+    # Retry-After is either a number of seconds or an HTTP date.
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    from email.utils import parsedate_to_datetime
+
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    return max(0.0, when.timestamp() - time.time())
+
+def get_scheduler():
+    # The process-wide scheduler that every client shares by default.
+    global _scheduler
+
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = request_scheduler()
+
+    return _scheduler
@@ -0,0 +1,396 @@
+#!/usr/bin/env python
+#
+# Notes:
+# Local SQLite copy of exported records, kept up to date incrementally. A full
+# export of every open severity 4 finding moves the whole dataset each time,
+# even though only a sliver of it changes between hourly runs.
+#
+# run_incremental() remembers, per export definition (see export_key()), the
+# newest last_observed it has stored: the high-water mark. The next run adds a
+# "last_observed gte <watermark>" condition to the export filter, so only the
+# records seen since then are exported, and upserts them by id into the store.
+# Each export is downloaded to a file next to the store first, then merged:
+# the records and the new watermark are committed in one transaction, so a
+# failed or interrupted run never moves the watermark past data it didn't
+# save. A download that fails part way is kept, and the finished job is
+# remembered, so the next run (while the job is still within REUSE_MAX_AGE)
+# resumes that download instead of exporting everything again.
+#
+# The watermark is pulled back by WATERMARK_OVERLAP to pick up records that
+# Tenable.io indexes a little late (re-fetching a few is harmless, they're
+# upserted). Records that drop out of the filter entirely (a finding marked
+# FIXED, a deleted asset) aren't in any delta, so a full export still replaces
+# the stored copy every FULL_REFRESH_AGE.
+#
+# Asset and finding records are also indexed as they're merged, by asset id,
+# tenable_id, agent name, IP and plugin id (see INDEX_FIELDS), so lookup()
+# answers "this agent's findings" from disk in milliseconds, with no API calls.
+# age() says how old the stored data for a source is; past STALE_AFTER,
+# callers should go back to the live API.
+#
+# Author: ThisTooShallXSS (https://github.com/thistooshallxss)
+# Requirements: Python 3, requests (for tio_client.py)
+#
+# Usage:
+# - from tio_store import run_incremental, get_store
+# - result = run_incremental(payload)              # Full the first time, deltas after that
+# - print(result.full, result.rows, result.watermark)
+# - for record in get_store().records(export_key(payload)): ...
+# - assets = get_store().lookup('agent_name', 'Garys-Laptop', 'assets')
+# - assets = export_store(readonly=True).lookup('agent_name', 'garys', 'assets', match=True)   # Any part of the name
+# - findings = get_store().lookup('asset_id', get_record_id(assets[0]), 'findings')
+# - get_store().age('findings')                    # Seconds since the last merge, or None
+# - get_store().filters('findings')                # What the stored exports were filtered on
+#
+# TIO_STORE_PATH overrides where the database is kept (default ./tio_store.sqlite).
+
+import copy
+import datetime
+import glob
+import json
+import os
+import sqlite3
+import threading
+import time
+import urllib.request
+
+from tio_exports import (POLL_INTERVAL, PART_SUFFIX, create_export, download_export, export_key, find_reusable_export,
+                         forget_export, iter_file_records, remember_export, wait_for_export)
+
+STORE_PATH = os.environ.get('TIO_STORE_PATH', 'tio_store.sqlite')
+WATERMARK_FIELD = 'last_observed'
+WATERMARK_OVERLAP = 3600 # Seconds the watermark is pulled back by, for late-indexed records.
+FULL_REFRESH_AGE = 7 * 86400 # Seconds between full exports, which drop records that left the filter.
+MERGE_BATCH = 10000 # Rows per executemany() while merging.
+STALE_AFTER = 2 * 3600 # Seconds after which stored data should no longer be trusted over the live API.
+
+# Source prefix -> lookup kind -> the record fields that hold its values.
+INDEX_FIELDS = {
+    'assets': {
+        'asset_id': ['id'],
+        'tenable_id': ['tenable_id'],
+        'agent_name': ['agent_name'],
+        'ip': ['ipv4_addresses', 'display_ipv4_address'],
+    },
+    'findings': {
+        'asset_id': ['asset.id'],
+        'tenable_id': ['asset.tenable_id'],
+        'agent_name': ['asset.agent_name'],
+        'ip': ['asset.host_ips', 'asset.display_ipv4_address'],
+        'plugin_id': ['definition.id'],
+    },
+}
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_record_id(record):
+    # Asset exports may echo the field as requested, e.g. "Id".
+    if 'id' in record:
+        return record['id']
+    for key, value in record.items():
+        if key.lower() == 'id':
+            return value
+    return None
+
+def _lookup(record, field):
+    for part in field.split('.'):
+        if not isinstance(record, dict):
+            return None
+        record = record.get(part)
+    return record
+
+def _index_fields(source):
+    for prefix, fields in INDEX_FIELDS.items():
+        if (source or '').startswith(prefix):
+            return fields
+    return {}
+
+def _index_rows(key, record_id, record, fields):
+    # (export_key, id, kind, value) rows for one record; values are lowercased
+    # so lookups are case insensitive, and lists index every entry.
+    rows = set()
+    for kind, names in fields.items():
+        for name in names:
+            value = get_record_id(record) if name == 'id' else _lookup(record, name)
+            for v in (value if isinstance(value, list) else [value]):
+                if v not in (None, ''):
+                    rows.add((key, record_id, kind, str(v).lower()))
+    return rows
+
+def _since(watermark, overlap):
+    # '2026-10-18T09:15:00.000Z' minus overlap seconds, in the same format.
+    when = datetime.datetime.strptime(watermark[:19], '%Y-%m-%dT%H:%M:%S') - datetime.timedelta(seconds=overlap)
+    return when.strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+def delta_payload(payload, since, watermark_field=WATERMARK_FIELD):
+    # Copy of payload whose filter also requires watermark_field >= since.
+    payload = copy.deepcopy(payload)
+    definition = payload.setdefault('definition', {})
+    condition = {'property': watermark_field, 'operator': 'gte', 'value': since}
+    current = definition.get('filter')
+
+    if not current:
+        definition['filter'] = {'and': [condition]}
+    elif list(current) == ['and']:
+        current['and'].append(condition)
+    else:
+        definition['filter'] = {'and': [current, condition]}
+
+    return payload
+
+class export_state(object): # What the store knows about one export definition.
+    def __init__(self, key, watermark=None, last_full=None, updated=None):
+        self.key = key
+        self.watermark = watermark # Newest watermark_field value stored so far.
+        self.last_full = last_full # When the last full export was merged (epoch seconds).
+        self.updated = updated # When anything was last merged (epoch seconds).
+
+class merge_result(object): # What one run_incremental() call did.
+    def __init__(self, key, job_id, full, rows, watermark):
+        self.key = key
+        self.id = job_id
+        self.full = full
+        self.rows = rows # Records exported and merged by this run.
+        self.watermark = watermark
+
+class export_store(object): # SQLite table of records per export definition, plus their watermarks.
+    def __init__(self, path=STORE_PATH, readonly=False):
+        # readonly opens an existing store for lookups only: nothing is
+        # created, migrated or reindexed, so check `indexed` before lookup().
+        self.path = path
+        self._lock = threading.Lock()
+
+        if readonly:
+            uri = 'file:{}?mode=ro'.format(urllib.request.pathname2url(os.path.abspath(path)))
+            self._db = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            self.indexed = self._has_table('record_index')
+            return
+
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        indexed = self._has_table('record_index')
+        self._db.executescript('''
+            CREATE TABLE IF NOT EXISTS records (
+                export_key TEXT NOT NULL,
+                id TEXT NOT NULL,
+                observed TEXT,
+                data TEXT NOT NULL,
+                PRIMARY KEY (export_key, id)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS watermarks (
+                export_key TEXT PRIMARY KEY,
+                name TEXT,
+                source TEXT,
+                watermark TEXT,
+                last_full REAL,
+                updated REAL,
+                filter TEXT
+            );
+            CREATE TABLE IF NOT EXISTS record_index (
+                export_key TEXT NOT NULL,
+                id TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                value TEXT NOT NULL,
+                PRIMARY KEY (export_key, id, kind, value)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS record_index_lookup ON record_index (kind, value);
+        ''')
+
+        if not self._has_column('watermarks', 'filter'):
+            self._db.execute('ALTER TABLE watermarks ADD COLUMN filter TEXT') # A store from before filters were kept.
+
+        if not indexed:
+            self.reindex() # A store from before the index existed.
+        self.indexed = True
+
+    def _has_table(self, table):
+        return self._db.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (table,)).fetchone() is not None
+
+    def _has_column(self, table, column):
+        return column in [row[1] for row in self._db.execute('PRAGMA table_info({})'.format(table))]
+
+    def state(self, key):
+        with self._lock:
+            row = self._db.execute('SELECT watermark, last_full, updated FROM watermarks WHERE export_key = ?',
+                                   (key,)).fetchone()
+
+        return export_state(key, *row) if row else export_state(key)
+
+    def merge(self, payload, records, full=False, watermark_field=WATERMARK_FIELD):
+        # Upserts records (an iterable, consumed as it streams) under the
+        # payload's export_key and advances its watermark, all in one
+        # transaction. A full merge replaces everything stored for the key.
+        # Pass the original payload, not the delta one. Returns (rows merged,
+        # new watermark).
+        key = export_key(payload)
+        fields = _index_fields(payload.get('source'))
+        newest = None if full else self.state(key).watermark
+        count = 0
+        now = time.time()
+
+        with self._lock, self._db:
+            if full:
+                self._db.execute('DELETE FROM records WHERE export_key = ?', (key,))
+                self._db.execute('DELETE FROM record_index WHERE export_key = ?', (key,))
+
+            batch = []
+            index = set()
+            for record in records:
+                record_id = str(get_record_id(record))
+                observed = _lookup(record, watermark_field)
+                if observed is not None and (newest is None or observed > newest):
+                    newest = observed
+                batch.append((key, record_id, observed, json.dumps(record)))
+                index.update(_index_rows(key, record_id, record, fields))
+
+                if len(batch) >= MERGE_BATCH:
+                    self._write(batch, index, full)
+                    count += len(batch)
+                    batch = []
+                    index = set()
+
+            self._write(batch, index, full)
+            count += len(batch)
+
+            self._db.execute('''
+                INSERT INTO watermarks (export_key, name, source, watermark, last_full, updated, filter)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (export_key) DO UPDATE SET
+                    name = excluded.name, source = excluded.source, watermark = excluded.watermark,
+                    last_full = COALESCE(excluded.last_full, watermarks.last_full), updated = excluded.updated,
+                    filter = excluded.filter
+            ''', (key, payload.get('name'), payload.get('source'), newest, now if full else None, now,
+                  json.dumps((payload.get('definition') or {}).get('filter'))))
+
+        return count, newest
+
+    def _write(self, batch, index, full):
+        if not full:
+            # Upserted records may have changed IP, name, etc.; drop their old index rows.
+            self._db.executemany('DELETE FROM record_index WHERE export_key = ? AND id = ?', [row[:2] for row in batch])
+        self._db.executemany('INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?)', batch)
+        self._db.executemany('INSERT OR IGNORE INTO record_index VALUES (?, ?, ?, ?)', index)
+
+    def reindex(self):
+        # Rebuilds record_index from the stored records.
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM record_index')
+            for key, source in self._db.execute('SELECT export_key, source FROM watermarks').fetchall():
+                fields = _index_fields(source)
+                for record_id, data in self._db.execute('SELECT id, data FROM records WHERE export_key = ?', (key,)):
+                    self._db.executemany('INSERT OR IGNORE INTO record_index VALUES (?, ?, ?, ?)',
+                                         _index_rows(key, record_id, json.loads(data), fields))
+
+    def lookup(self, kind, value, source=None, match=False):
+        # Records whose `kind` (asset_id, tenable_id, agent_name, ip or
+        # plugin_id) is value, or contains it with match=True (like the API's
+        # "match" operator), from exports whose source starts with `source`
+        # ('assets', 'findings'). Each record is returned once, even if more
+        # than one stored export contains it.
+        value = str(value).lower()
+        if match:
+            value = '%' + value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+        query = '''
+            SELECT DISTINCT r.id, r.data FROM record_index i
+            JOIN records r ON r.export_key = i.export_key AND r.id = i.id
+            JOIN watermarks w ON w.export_key = i.export_key
+            WHERE i.kind = ? AND i.value {} AND w.source LIKE ?
+        '''.format("LIKE ? ESCAPE '\\'" if match else '= ?')
+        with self._lock:
+            rows = self._db.execute(query, (kind, value, (source or '') + '%')).fetchall()
+
+        seen = set()
+        records = []
+        for record_id, data in rows:
+            if record_id not in seen:
+                seen.add(record_id)
+                records.append(json.loads(data))
+        return records
+
+    def age(self, source=None):
+        # Seconds since records from a source (prefix) were last merged, or
+        # None if there are none.
+        with self._lock:
+            updated = self._db.execute('SELECT MAX(updated) FROM watermarks WHERE source LIKE ?',
+                                       ((source or '') + '%',)).fetchone()[0]
+        return None if updated is None else time.time() - updated
+
+    def filters(self, source=None):
+        # The export filter of every stored definition for a source (prefix).
+        # Each is a dict, None for "no filter", or 'unknown' for a definition
+        # stored before filters were kept.
+        column = 'filter' if self._has_column('watermarks', 'filter') else 'NULL' # Read-only, not yet migrated.
+        with self._lock:
+            rows = self._db.execute('SELECT {} FROM watermarks WHERE source LIKE ?'.format(column),
+                                    ((source or '') + '%',)).fetchall()
+        return [json.loads(row[0]) if row[0] is not None else 'unknown' for row in rows]
+
+    def records(self, key):
+        # Yields every stored record for an export_key, MERGE_BATCH rows at a time.
+        last = ''
+        while True:
+            with self._lock:
+                rows = self._db.execute('SELECT id, data FROM records WHERE export_key = ? AND id > ? ORDER BY id LIMIT ?',
+                                        (key, last, MERGE_BATCH)).fetchall()
+            if not rows:
+                return
+
+            for row in rows:
+                yield json.loads(row[1])
+            last = rows[-1][0]
+
+    def count(self, key):
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM records WHERE export_key = ?', (key,)).fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+def get_store():
+    global _store
+
+    with _store_lock:
+        if _store is None:
+            _store = export_store()
+
+    return _store
+
+def run_incremental(payload, store=None, watermark_field=WATERMARK_FIELD, overlap=WATERMARK_OVERLAP,
+                    full_refresh_age=FULL_REFRESH_AGE, poll_interval=POLL_INTERVAL):
+    # Exports only what changed since the last run of this same definition
+    # (or everything, the first time and every full_refresh_age), merges it
+    # into the store, and returns a merge_result.
+    store = store if store is not None else get_store()
+    state = store.state(export_key(payload))
+    full = state.watermark is None or state.last_full is None or time.time() - state.last_full >= full_refresh_age
+
+    # Until a merge moves the watermark, a rerun asks for exactly the same
+    # export, so a finished job left by a failed run can be picked up again.
+    exported = payload if full else delta_payload(payload, _since(state.watermark, overlap), watermark_field)
+    job_id = find_reusable_export(exported)
+
+    if job_id is None:
+        job_id = create_export(exported)
+        wait_for_export(job_id, poll_interval=poll_interval)
+        remember_export(exported, job_id)
+
+    # Download before merging, so the store's write transaction only lasts as
+    # long as parsing a local file, not the transfer. The path only depends
+    # on the definition and job, so a .part left by a failed run is resumed.
+    prefix = os.path.join(os.path.dirname(os.path.abspath(store.path)), 'tio_store-{}-'.format(state.key))
+    path = '{}{}.json'.format(prefix, job_id)
+
+    for stale in glob.glob(glob.escape(prefix) + '*'):
+        if stale not in (path, path + PART_SUFFIX):
+            os.remove(stale) # From a job that can't be resumed any more.
+
+    download_export(job_id, path)
+    rows, watermark = store.merge(payload, iter_file_records(path), full, watermark_field)
+
+    forget_export(exported)
+    os.remove(path)
+
+    return merge_result(state.key, job_id, full, rows, watermark)
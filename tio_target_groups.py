@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+#
+# Notes:
+# Target group registry shared by the target group generator scripts. The old
+# tg_name_exists() downloaded the full /target-groups list and scanned it for
+# every tag, agent group or severity being synced. The registry downloads the
+# list once per run into a dict keyed by name, and keeps that dict up to date
+# as the script creates (POST) or updates (PUT) groups itself.
+#
+# sync() compares the members a group should have with the members it already
+# has, as order-independent sets of addresses (however they're split into
+# CIDR blocks), and skips the PUT entirely when nothing has changed. Most
+# hourly runs end up writing nothing at all.
+#
+# build_members() turns a list of IPs into the member string in one pass:
+# deduped, sorted, and with contiguous addresses collapsed into CIDR blocks, so
+# large groups cost less CPU to build and far fewer bytes to send.
+#
+# Author: ThisTooShallXSS (https://github.com/thistooshallxss)
+# Requirements: Python 3, requests (for tio_client.py)
+#
+# Usage:
+# - from tio_target_groups import get_registry
+# - tg_id = get_registry().get_id('zTag: Location - Boston (static)')   # 0 if missing
+# - tg_id = get_registry().save(name, '10.0.0.1,10.0.0.2')             # POST or PUT
+# - result = get_registry().sync(name, '10.0.0.1,10.0.0.2')            # Only if changed
+# - print(result.addresses, result.added, result.removed, result.changed)   # Counted in addresses
+# - members = build_members(['10.0.0.1', '10.0.0.0', '10.0.0.2'])     # '10.0.0.0/31,10.0.0.2'
+
+import ipaddress
+import socket
+import threading
+
+from tio_client import create_target_group, get_data
+
+_registry = None
+_registry_lock = threading.Lock()
+
+IGNORED_MEMBERS = ('0.0.0.0',) # Placeholder address Tenable.io reports for some assets.
+
+def _ipv4_int(ip):
+    # Fast path for the common case of a plain dotted-quad IPv4 address.
+    try:
+        return int.from_bytes(socket.inet_pton(socket.AF_INET, ip), 'big')
+    except (OSError, ValueError):
+        return None
+
+def _ipv4_str(addr):
+    return socket.inet_ntop(socket.AF_INET, addr.to_bytes(4, 'big'))
+
+def _collapse_ipv4(addrs):
+    # addrs is a sorted list of unique IPv4 ints. Runs of consecutive addresses
+    # are turned into the fewest CIDR blocks that cover them exactly.
+    blocks = []
+    x = 0
+    while x < len(addrs):
+        start = addrs[x]
+        while x + 1 < len(addrs) and addrs[x + 1] == addrs[x] + 1:
+            x += 1
+        end = addrs[x]
+        x += 1
+
+        if start == end:
+            blocks.append(_ipv4_str(start))
+        else:
+            blocks.extend(_network_str(n) for n in ipaddress.summarize_address_range(
+                ipaddress.IPv4Address(start), ipaddress.IPv4Address(end)))
+    return blocks
+
+def _network_str(net):
+    return str(net.network_address) if net.num_addresses == 1 else str(net)
+
+def build_members(ips, keep=None, collapse=True):
+    # Returns the comma separated member string for a target group. keep is an
+    # optional filter, e.g. is_internal. Anything that isn't an IP or network
+    # (ranges, hostnames) is passed through as-is, deduped, after the networks.
+    v4 = set()
+    networks = set()
+    other = set()
+
+    for ip in ips:
+        ip = str(ip).strip()
+        if not ip or ip in IGNORED_MEMBERS:
+            continue
+        if keep is not None and not keep(ip):
+            continue
+
+        addr = _ipv4_int(ip)
+        if addr is not None:
+            v4.add(addr)
+            continue
+
+        try:
+            networks.add(ipaddress.ip_network(ip, strict=False))
+        except ValueError:
+            other.add(ip)
+
+    v4_networks = [n for n in networks if n.version == 4]
+    v6_networks = [n for n in networks if n.version == 6]
+
+    if not collapse:
+        members = [_ipv4_str(a) for a in sorted(v4)]
+        members.extend(_network_str(n) for n in sorted(v4_networks) + sorted(v6_networks))
+    elif v4_networks:
+        # Explicit IPv4 networks may overlap the single addresses, so let
+        # ipaddress merge everything (slower, but rare).
+        v4_networks.extend(ipaddress.IPv4Network(a) for a in v4)
+        members = [_network_str(n) for n in ipaddress.collapse_addresses(v4_networks)]
+        members.extend(_network_str(n) for n in ipaddress.collapse_addresses(v6_networks))
+    else:
+        members = _collapse_ipv4(sorted(v4))
+        members.extend(_network_str(n) for n in ipaddress.collapse_addresses(v6_networks))
+
+    members.extend(sorted(other))
+    return ','.join(members)
+
+def member_set(members):
+    # Normalized, order-independent view of a comma separated member string.
+    # IPs and networks are parsed, so '10.0.0.2' and '10.0.0.2/32' are equal.
+    members_out = set()
+    for m in (members or '').split(','):
+        m = m.strip().lower()
+        if not m:
+            continue
+        try:
+            members_out.add(ipaddress.ip_network(m, strict=False))
+        except ValueError:
+            members_out.add(m) # Ranges, hostnames.
+    return members_out
+
+def _address_total(members):
+    # Addresses covered by a member_set(), with overlaps counted once. Each
+    # non-network member (range, hostname) counts as one.
+    total = 0
+    for version in (4, 6):
+        networks = [m for m in members if not isinstance(m, str) and m.version == version]
+        total += sum(n.num_addresses for n in ipaddress.collapse_addresses(networks))
+    return total + sum(1 for m in members if isinstance(m, str))
+
+def address_count(members):
+    # How many addresses a comma separated member string covers, e.g.
+    # '10.0.0.0/29,10.0.1.5' -> 9.
+    return _address_total(member_set(members))
+
+def member_diff(desired, current):
+    # (added, removed): addresses in desired but not current, and the other
+    # way around, however either side happens to be split into blocks.
+    desired = member_set(desired)
+    current = member_set(current)
+    union = _address_total(desired | current)
+    return union - _address_total(current), union - _address_total(desired)
+
+class sync_result(object): # What sync() did to one target group.
+    def __init__(self, tg_id, name, added, removed, created=False, addresses=0):
+        self.id = tg_id
+        self.name = name
+        self.added = added # Addresses that weren't in the group before.
+        self.removed = removed # Addresses that were dropped from the group.
+        self.created = created
+        self.addresses = addresses # Addresses in the group now.
+
+    @property
+    def changed(self):
+        return self.created or self.added > 0 or self.removed > 0
+
+class target_group_registry(object): # name -> target group record, loaded once.
+    def __init__(self):
+        self._by_name = None
+        self._lock = threading.Lock()
+
+    def _groups(self):
+        with self._lock:
+            if self._by_name is None:
+                self.load()
+        return self._by_name
+
+    def load(self):
+        # (Re)reads /target-groups. Called lazily by the first lookup.
+        target_groups = get_data('/target-groups')["target_groups"]
+        self._by_name = {}
+
+        for tg in target_groups:
+            self._by_name[tg["name"]] = tg
+
+    def get(self, name):
+        return self._groups().get(name)
+
+    def get_id(self, name):
+        tg = self.get(name)
+        return tg["id"] if tg else 0
+
+    def save(self, name, members):
+        # Creates the group, or replaces the members of the existing group of
+        # the same name. Returns the target group id.
+        tg_id = self.get_id(name)
+
+        if tg_id > 0:
+            tg_id = create_target_group('PUT', members, name, tg_id)
+        else:
+            tg_id = create_target_group('POST', members, name, 0)
+
+        with self._lock:
+            self._by_name[name] = dict(self._by_name.get(name) or {}, id=tg_id, name=name, members=members)
+
+        return tg_id
+
+    def sync(self, name, members):
+        # Like save(), but only writes when the membership actually differs
+        # from what Tenable.io already has. Returns a sync_result.
+        tg = self.get(name)
+        addresses = address_count(members)
+
+        if tg is None:
+            return sync_result(self.save(name, members), name, addresses, 0, created=True, addresses=addresses)
+
+        added, removed = member_diff(members, tg.get('members'))
+
+        if added == 0 and removed == 0:
+            return sync_result(tg["id"], name, 0, 0, addresses=addresses)
+
+        return sync_result(self.save(name, members), name, added, removed, addresses=addresses)
+
+def get_registry():
+    global _registry
+
+    with _registry_lock:
+        if _registry is None:
+            _registry = target_group_registry()
+
+    return _registry